@@ -0,0 +1,231 @@
+"""DataManager の負荷試験 (fake_discord のギルドに N 人のメンバーが同時に操作する)
+
+リポジトリのルートで実行する:
+
+    python benchmarks/bench_load.py --members 20 --actions 10 --out load.json
+    python benchmarks/bench_load.py --members 50 --scale 0.1   # 遅延とレート制限の窓を 1/10 にして短時間で回す
+
+各メンバーは save_log / refresh_goals_panel / resend_dashboard / report (レポート生成ボタン) を
+--mix の重みで選んで --actions 回実行する。操作ごとの件数・スループット・p50/p95/p99 の応答時間と、
+操作1回あたりの API 呼び出し回数 (裏で続く処理の分も含む)・429 の回数を JSON で出力する。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import discord
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_discord import FakeAPI, FakeBot, FakeInteraction, FakeUser, FakeMessage, current_action
+from synthetic import generate_logs, generate_goals
+
+ACTIONS = ["save_log", "refresh_goals_panel", "resend_dashboard", "report"]
+DEFAULT_MIX = "save_log=6,refresh_goals_panel=1,resend_dashboard=2,report=1"
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ACTIONS: raise SystemExit(f"unknown action: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def configure(args):
+    """main を読み込む前に、ベンチマーク用の設定を環境変数で渡す"""
+    db_path = os.path.join(tempfile.gettempdir(), f"bench_load_{os.getpid()}.db")
+    os.environ["LOG_DB_PATH"] = db_path
+    os.environ["RENDER_WORKERS"] = str(args.render_workers)
+    # まとめて1回にする待ち時間も、遅延と同じ倍率で縮める
+    os.environ["GOALS_REFRESH_DELAY"] = str(2 * args.scale)
+    os.environ["DASHBOARD_MOVE_DELAY"] = str(1 * args.scale)
+    return db_path
+
+def seed_channel(main, api, channel, logs):
+    """過去のログを、送信時刻に合わせた ID の埋め込みメッセージとして置く (API は呼ばない)"""
+    for i, log in enumerate(logs):
+        ts = datetime.datetime.fromisoformat(log["timestamp"])
+        embed = main.DataManager.build_log_embed(log, f"LOG_ID:{json.dumps(log, ensure_ascii=False)}")
+        msg_id = discord.utils.time_snowflake(ts + datetime.timedelta(seconds=1)) + i % 4096
+        channel.add(FakeMessage(channel, msg_id, embeds=[embed], author=channel.guild.me))
+    api.last_id = max(api.last_id, channel.last_message_id or 0)
+
+async def setup_guild(main, api, bot, args):
+    """サーバーの初期状態 (/setup_server 後、過去ログと目標あり) を用意する"""
+    guild = bot.add_guild(1000)
+    dm = main.DataManager(bot)
+    data_ch = await dm.get_data_channel(guild)
+    seed_channel(main, api, data_ch, generate_logs(args.seed_logs, seed=args.seed))
+    for name in (main.CH_DASHBOARD, main.CH_TIMELINE, main.CH_GOALS, main.CH_REPORT):
+        await dm.get_channel_by_name(guild, name)
+    await dm.load_tasks(guild)
+    await dm.save_goals(guild, generate_goals())
+    # 最初のバックフィルとパネルの設置は計測の外で済ませる
+    await dm.get_log_cache(guild)
+    await dm.refresh_goals_panel(guild)
+    await dm.move_dashboard(guild, discord.utils.get(guild.text_channels, name=main.CH_DASHBOARD))
+    guild.members = [FakeUser(10_000 + i, f"member{i}") for i in range(args.members)]
+    return guild
+
+def make_log(main, rng):
+    task = rng.choice(["勉強", "読書", "運動", "食事", "風呂", "コーヒー"])
+    minutes = rng.randint(5, 120)
+    end_time = datetime.datetime.now(main.JST)
+    return {
+        "task": task,
+        "duration_min": minutes,
+        "duration_str": f"{minutes}分 0秒",
+        "memo": rng.choice(["", "", "集中できた", "復習"]),
+        "date": end_time.strftime("%Y-%m-%d"),
+        "timestamp": end_time.isoformat(),
+    }
+
+async def run_action(main, bot, guild, member, name, rng):
+    dm = main.DataManager(bot)
+    dashboard_ch = discord.utils.get(guild.text_channels, name=main.CH_DASHBOARD)
+    if name == "save_log":
+        await dm.save_log(guild, make_log(main, rng))
+    elif name == "refresh_goals_panel":
+        await dm.refresh_goals_panel(guild)
+    elif name == "resend_dashboard":
+        await main.resend_dashboard(FakeInteraction(guild, dashboard_ch, member), bot)
+    elif name == "report":
+        view = main.ReportConfigView(bot, await dm.load_tasks(guild))
+        view.selected_charts = rng.choice([["pie"], ["pie", "bar"], ["heatmap"], ["pie", "bar", "timeline"]])
+        button = next(item for item in view.children if isinstance(item, main.ReportGenerateButton))
+        await button.callback(FakeInteraction(guild, dashboard_ch, member))
+
+async def member_loop(main, bot, guild, member, args, mix, latencies, seed):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    for _ in range(args.actions):
+        await asyncio.sleep(rng.expovariate(1 / args.think) if args.think else 0)
+        name = rng.choices(names, weights)[0]
+        token = current_action.set(name)
+        started = time.perf_counter()
+        try:
+            await run_action(main, bot, guild, member, name, rng)
+            latencies[name].append(time.perf_counter() - started)
+        except Exception as e:
+            latencies[name + ":error"].append(time.perf_counter() - started)
+            print(f"{name} failed: {e!r}", file=sys.stderr)
+        finally:
+            current_action.reset(token)
+
+async def drain(main, timeout):
+    """裏で続く処理 (タイムライン転記・パネル更新) が終わるまで待つ"""
+    deadline = time.perf_counter() + timeout
+    while main.background_tasks and time.perf_counter() < deadline:
+        await asyncio.gather(*list(main.background_tasks), return_exceptions=True)
+
+def summarize(latencies, api, elapsed):
+    actions = {}
+    for name, samples in sorted(latencies.items()):
+        if name.endswith(":error"): continue
+        ms = np.array(samples) * 1000
+        calls = api.by_action.get(name, {})
+        actions[name] = {
+            "count": len(samples),
+            "errors": len(latencies.get(name + ":error", [])),
+            "throughput_per_sec": round(len(samples) / elapsed, 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "mean_ms": round(statistics.fmean(ms), 1),
+            "api_calls_per_action": round(sum(v for k, v in calls.items() if k != "429") / len(samples), 2),
+            "api_calls_by_kind": {k: round(v / len(samples), 2) for k, v in sorted(calls.items()) if k != "429"},
+            "rate_limited_per_action": round(calls.get("429", 0) / len(samples), 2),
+            "bytes_up_per_action": round(api.bytes_by_action.get(name, 0) / len(samples)),
+        }
+    return actions
+
+async def run(args):
+    import main
+    mix = parse_mix(args.mix)
+    api = FakeAPI(latency=args.latency / 1000, jitter=args.jitter / 1000, scale=args.scale, seed=args.seed)
+    bot = FakeBot(api)
+    main.client = bot
+    guild = await setup_guild(main, api, bot, args)
+    await drain(main, 60)
+    if args.render_workers: main.warm_render_pool()
+    api.reset_counters()
+    main.handler_stats.clear()
+
+    latencies = defaultdict(list)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        member_loop(main, bot, guild, member, args, mix, latencies, args.seed + i)
+        for i, member in enumerate(guild.members)
+    ))
+    elapsed = time.perf_counter() - started
+    await drain(main, 120)
+    drained = time.perf_counter() - started
+    main.shutdown_render_pool()
+
+    total = sum(len(v) for k, v in latencies.items() if not k.endswith(":error"))
+    return {
+        "meta": {
+            "at": datetime.datetime.now(main.JST).isoformat(),
+            "members": args.members,
+            "actions_per_member": args.actions,
+            "mix": mix,
+            "think_sec": args.think,
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "scale": args.scale,
+            "seed_logs": args.seed_logs,
+            "render_workers": args.render_workers,
+            "storage_mode": main.LOG_STORAGE_MODE,
+        },
+        "elapsed_sec": round(elapsed, 3),
+        "drained_sec": round(drained, 3),
+        "throughput_per_sec": round(total / elapsed, 2),
+        "actions": summarize(latencies, api, elapsed),
+        "api": api.report(),
+        "handlers": main.timing_report(),
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=20, help="同時に操作するメンバー数")
+    parser.add_argument("--actions", type=int, default=10, help="メンバーごとの操作回数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="操作の重み (name=weight をカンマ区切り)")
+    parser.add_argument("--think", type=float, default=0.5, help="操作の間隔の平均 (秒、指数分布)")
+    parser.add_argument("--latency", type=float, default=80, help="REST 呼び出しの平均遅延 (ms)")
+    parser.add_argument("--jitter", type=float, default=30, help="遅延のばらつき (ms)")
+    parser.add_argument("--scale", type=float, default=1.0, help="遅延・レート制限の窓・まとめ待ちにかける倍率")
+    parser.add_argument("--seed-logs", type=int, default=2000, help="最初からあるログの件数")
+    parser.add_argument("--render-workers", type=int, default=2, help="描画ワーカー数 (0 ならスレッド)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="結果の JSON の保存先 (省略時は標準出力)")
+    args = parser.parse_args()
+
+    db_path = configure(args)
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if os.path.exists(db_path): os.remove(db_path)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for name, a in report["actions"].items():
+        print(f"{name:<20} ×{a['count']:<4} p50 {a['p50_ms']:8.1f}ms  p99 {a['p99_ms']:8.1f}ms  "
+              f"API {a['api_calls_per_action']:5.2f}/回  429 {a['rate_limited_per_action']:.2f}/回", file=sys.stderr)
+    print(f"throughput {report['throughput_per_sec']}/s  elapsed {report['elapsed_sec']}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main_cli()
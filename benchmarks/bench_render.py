@@ -0,0 +1,154 @@
+"""グラフ作成まわりのベンチマーク
+
+リポジトリのルートで実行する (font.ttf を同じ場所から読むため):
+
+    python benchmarks/bench_render.py --sizes 1000,10000 --out before.json
+    python benchmarks/bench_render.py --sizes 1000,10000 --out after.json --compare before.json
+
+各行数について、合成ログから LogTable を作り、_prepare_df・各グラフ (create_*)・render_combined・
+calculate_progress の実行時間 (repeat 回の最小と中央値)・tracemalloc のピーク・PNG のバイト数を JSON で出力する。
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# ベンチマークで本番のデータベースに触らないように
+os.environ.setdefault("LOG_DB_PATH", os.path.join(tempfile.gettempdir(), "bench_render.db"))
+
+import main
+from main import GraphGenerator, LogTable, JST
+from synthetic import generate_logs, generate_goals, default_days
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+def measure(func, repeat):
+    """func を repeat 回測り、最後に tracemalloc を有効にしてもう1回実行してピークを取る"""
+    walls = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        walls.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {"min": min(walls), "median": statistics.median(walls)}, peak
+
+def png_bytes(result):
+    if isinstance(result, io.BytesIO): return len(result.getvalue())
+    if isinstance(result, (bytes, bytearray)): return len(result)
+    return None
+
+def bench_size(n, range_days, repeat):
+    logs = generate_logs(n)
+    end = datetime.datetime.now(JST).replace(tzinfo=None, hour=23, minute=59, second=59, microsecond=0)
+    start = end - datetime.timedelta(days=range_days) if range_days else None
+    target_date = (end - datetime.timedelta(days=1)).date()
+    goals = generate_goals()
+    results = []
+
+    def step(name, func):
+        result, wall, peak = measure(func, repeat)
+        results.append({"rows": n, "step": name, "wall_sec": wall, "peak_bytes": peak, "png_bytes": png_bytes(result)})
+        print(f"{n:>9} {name:<28} {wall['median'] * 1000:10.1f}ms  peak {peak / 1024 / 1024:7.1f}MB", file=sys.stderr)
+        return result
+
+    table = step("LogTable.from_logs", lambda: LogTable.from_logs(logs))
+    step("_prepare_df", lambda: GraphGenerator._prepare_df(table, start, end))
+    for name, create in [
+        ("create_pie_chart", GraphGenerator.create_pie_chart),
+        ("create_bar_chart", GraphGenerator.create_bar_chart),
+        ("create_heatmap", GraphGenerator.create_heatmap),
+        ("create_punch_card", GraphGenerator.create_punch_card),
+        ("create_timeline_vertical", GraphGenerator.create_timeline_vertical),
+    ]:
+        step(name, lambda create=create: create(table, start, end, None))
+    step("create_daily_timeline", lambda: GraphGenerator.create_daily_timeline(table, target_date))
+    parts = [p for p in (GraphGenerator.chart_parts(c, table, start, end, None) for c in main.REPORT_CHARTS) if p]
+    if len(parts) > 1: step("render_combined", lambda: GraphGenerator.render_combined(parts))
+    step("calculate_progress", lambda: GraphGenerator.calculate_progress(table, goals))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def versions():
+    import matplotlib, numpy, pandas
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "matplotlib": matplotlib.__version__,
+        "discord.py": main.discord.__version__,
+    }
+
+def compare(results, baseline_path):
+    """同じ (行数, 処理) の中央値を前回の結果と比べて表示する"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["rows"], r["step"]): r for r in json.load(f)["results"]}
+    print(f"\n{'rows':>9} {'step':<28} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    for r in results:
+        old = baseline.get((r["rows"], r["step"]))
+        if old is None: continue
+        before, after = old["wall_sec"]["median"], r["wall_sec"]["median"]
+        ratio = after / before if before else float("inf")
+        print(f"{r['rows']:>9} {r['step']:<28} {before * 1000:9.1f}ms {after * 1000:9.1f}ms {ratio:6.2f}x", file=sys.stderr)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="ログの行数 (カンマ区切り)")
+    parser.add_argument("--range-days", type=int, default=30, help="グラフの対象期間 (日)。0 なら全期間")
+    parser.add_argument("--repeat", type=int, default=3, help="時間を測る回数")
+    parser.add_argument("--out", help="結果の JSON の保存先 (省略時は標準出力)")
+    parser.add_argument("--compare", help="比較する前回の結果 (JSON)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    # ライブラリの読み込みとひな形作りは Bot でも起動時に済ませるので、計測の外で行う
+    main.preload_chart_stack()
+    GraphGenerator.warm_templates()
+    results = []
+    for n in sizes:
+        results.extend(bench_size(n, args.range_days, args.repeat))
+    report = {
+        "meta": {
+            "at": datetime.datetime.now(JST).isoformat(),
+            "commit": git_commit(),
+            "platform": platform.platform(),
+            "versions": versions(),
+            "sizes": sizes,
+            "days": {n: default_days(n) for n in sizes},
+            "range_days": args.range_days,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,389 @@
+"""discord.py のギルド・テキストチャンネル・メッセージの代わり (DataManager を実サーバー無しで動かすため)
+
+DataManager が使う範囲だけを discord.py と同じ呼び方で実装している:
+  - history() は 100件ごとに1回の REST 呼び出し (before / after / oldest_first / limit の扱いも同じ)
+  - REST 呼び出しごとに遅延 (平均 latency 秒、ばらつき jitter 秒) を入れる
+  - 経路ごとのレート制限バケットを超えると 429 を返し、discord.py と同じく retry_after 秒待って再送する
+  - すべての呼び出しを種類別に数える (current_action で指定した操作ごとにも分けて数える)
+"""
+import asyncio
+import bisect
+import contextvars
+import random
+from collections import Counter, defaultdict
+
+import discord
+
+# 呼び出しをどの操作の分として数えるか (負荷試験で操作ごとに設定する)
+current_action = contextvars.ContextVar("fake_discord_action", default=None)
+
+# 経路ごとのレート制限: 種類 -> (回数, 秒)。チャンネルごとに別のバケット
+# (Discord が返すヘッダの値は公開されていないので、実測でよく見る値に合わせた目安)
+DEFAULT_LIMITS = {
+    "send": (5, 5.0),
+    "edit": (5, 5.0),
+    "delete": (5, 1.0),
+    "bulk_delete": (1, 1.0),
+    "history": (5, 5.0),
+    "pins": (5, 5.0),
+    "pin": (5, 5.0),
+    "fetch": (5, 5.0),
+    "create_channel": (10, 10.0),
+}
+# Bot 全体のレート制限 (回数, 秒)
+GLOBAL_LIMIT = (50, 1.0)
+
+class RateLimitBucket:
+    """固定窓のバケット。窓の最初の呼び出しから per 秒で残り回数が戻る"""
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def hit(self, now):
+        """1回分を消費できれば 0.0、できなければ retry_after (秒)"""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining == 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return 0.0
+
+class FakeAPI:
+    """遅延とレート制限を入れ、呼び出しを数える REST の代わり。scale で待ち時間をまとめて縮められる"""
+    def __init__(self, latency=0.05, jitter=0.02, scale=1.0, limits=None, global_limit=GLOBAL_LIMIT, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.scale = scale
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.global_bucket = RateLimitBucket(global_limit[0], global_limit[1] * scale) if global_limit else None
+        self.buckets = {}
+        self.rng = random.Random(seed)
+        self.last_id = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.bytes_up = 0
+        self.wait_sec = 0.0
+        self.by_action = defaultdict(Counter)
+        self.bytes_by_action = Counter()
+
+    def next_id(self):
+        """現在時刻のスノーフレーク (同じミリ秒でも必ず増える)"""
+        self.last_id = max(self.last_id + 1, discord.utils.time_snowflake(discord.utils.utcnow()))
+        return self.last_id
+
+    def bucket(self, kind, key):
+        if kind not in self.limits: return None
+        bucket = self.buckets.get((kind, key))
+        if bucket is None:
+            limit, per = self.limits[kind]
+            bucket = self.buckets[(kind, key)] = RateLimitBucket(limit, per * self.scale)
+        return bucket
+
+    async def request(self, kind, key=None, size=0):
+        """REST 呼び出し1回分。429 が返ったら retry_after 待って送り直す"""
+        action = current_action.get()
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)) * self.scale)
+            now = loop.time()
+            bucket = self.bucket(kind, key)
+            retry_after = bucket.hit(now) if bucket else 0.0
+            if not retry_after and self.global_bucket:
+                retry_after = self.global_bucket.hit(now)
+            if not retry_after: break
+            self.rate_limited[kind] += 1
+            self.by_action[action]["429"] += 1
+            self.wait_sec += retry_after
+            await asyncio.sleep(retry_after)
+        self.calls[kind] += 1
+        self.by_action[action][kind] += 1
+        self.bytes_up += size
+        self.bytes_by_action[action] += size
+
+    def report(self):
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "rate_limited": dict(self.rate_limited),
+            "rate_limit_wait_sec": round(self.wait_sec, 3),
+            "bytes_up": self.bytes_up,
+        }
+
+class _Response:
+    """discord.HTTPException に渡す応答の代わり"""
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+def not_found():
+    return discord.NotFound(_Response(404, "Not Found"), {"code": 10008, "message": "Unknown Message"})
+
+class FakeUser:
+    def __init__(self, id, name, bot=False):
+        self.id = id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{id}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeAttachment:
+    def __init__(self, file):
+        file.fp.seek(0)
+        self.data = file.fp.read()
+        self.filename = file.filename
+        self.size = len(self.data)
+
+    async def read(self):
+        return self.data
+
+def file_bytes(files):
+    return sum(len(f.fp.getbuffer()) if hasattr(f.fp, "getbuffer") else 0 for f in files)
+
+class FakeMessage:
+    def __init__(self, channel, id, content="", embeds=None, attachments=None, author=None):
+        self.channel = channel
+        self.guild = channel.guild
+        self.id = id
+        self.content = content or ""
+        self.embeds = embeds or []
+        self.attachments = attachments or []
+        self.author = author
+        self.pinned = False
+        self.view = None
+
+    @property
+    def created_at(self):
+        return discord.utils.snowflake_time(self.id)
+
+    async def edit(self, *, content=discord.utils.MISSING, embed=discord.utils.MISSING, embeds=discord.utils.MISSING, view=discord.utils.MISSING, **kwargs):
+        await self.channel.api.request("edit", self.channel.id)
+        if self.channel.get_message(self.id) is None: raise not_found()
+        if content is not discord.utils.MISSING: self.content = content or ""
+        if embed is not discord.utils.MISSING: self.embeds = [embed] if embed else []
+        if embeds is not discord.utils.MISSING: self.embeds = list(embeds)
+        if view is not discord.utils.MISSING: self.view = view
+        return self
+
+    async def delete(self):
+        await self.channel.api.request("delete", self.channel.id)
+        if not self.channel.remove(self.id): raise not_found()
+
+    async def pin(self):
+        await self.channel.api.request("pin", self.channel.id)
+        self.pinned = True
+
+    async def unpin(self):
+        await self.channel.api.request("pin", self.channel.id)
+        self.pinned = False
+
+class FakePartialMessage:
+    """get_partial_message() の戻り値。取得せずに ID だけで編集・削除する"""
+    def __init__(self, channel, id):
+        self.channel = channel
+        self.id = id
+
+    async def edit(self, **kwargs):
+        await self.channel.api.request("edit", self.channel.id)
+        msg = self.channel.get_message(self.id)
+        if msg is None: raise not_found()
+        # 呼び出しは上で数えたので、中身の書き換えだけを行う
+        for key in ("content", "embed", "embeds", "view"):
+            if key in kwargs:
+                value = kwargs[key]
+                if key == "content": msg.content = value or ""
+                elif key == "embed": msg.embeds = [value] if value else []
+                elif key == "embeds": msg.embeds = list(value)
+                else: msg.view = value
+        return msg
+
+    async def delete(self):
+        await self.channel.api.request("delete", self.channel.id)
+        if not self.channel.remove(self.id): raise not_found()
+
+class FakeTextChannel:
+    def __init__(self, guild, id, name, category=None):
+        self.guild = guild
+        self.api = guild.api
+        self.id = id
+        self.name = name
+        self.category = category
+        self.mention = f"<#{id}>"
+        self._ids = []
+        self._messages = {}
+
+    def __repr__(self):
+        return f"<FakeTextChannel name={self.name!r} messages={len(self._ids)}>"
+
+    @property
+    def last_message_id(self):
+        return self._ids[-1] if self._ids else None
+
+    @property
+    def messages(self):
+        return [self._messages[i] for i in self._ids]
+
+    def get_message(self, id):
+        return self._messages.get(id)
+
+    def add(self, msg):
+        """メッセージを直接置く (API を呼ばない。過去のログを用意するとき用)"""
+        bisect.insort(self._ids, msg.id)
+        self._messages[msg.id] = msg
+        return msg
+
+    def remove(self, id):
+        if self._messages.pop(id, None) is None: return False
+        del self._ids[bisect.bisect_left(self._ids, id)]
+        return True
+
+    async def send(self, content=None, *, embed=None, embeds=None, file=None, files=None, view=None, **kwargs):
+        files = ([file] if file else []) + list(files or [])
+        await self.api.request("send", self.id, file_bytes(files))
+        msg = FakeMessage(
+            self, self.api.next_id(), content, [embed] if embed else list(embeds or []),
+            [FakeAttachment(f) for f in files], self.guild.me
+        )
+        msg.view = view
+        return self.add(msg)
+
+    async def pins(self):
+        await self.api.request("pins", self.id)
+        return [self._messages[i] for i in reversed(self._ids) if self._messages[i].pinned][:50]
+
+    async def fetch_message(self, id):
+        await self.api.request("fetch", self.id)
+        msg = self.get_message(id)
+        if msg is None: raise not_found()
+        return msg
+
+    def get_partial_message(self, id):
+        return FakePartialMessage(self, id)
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        """discord.py と同じく、100件ごとに1回 API を呼びながら返す"""
+        if oldest_first is None: oldest_first = after is not None
+        lo_id = after.id if after is not None else 0
+        hi_id = before.id if before is not None else float("inf")
+        remaining = limit
+        while remaining is None or remaining > 0:
+            n = 100 if remaining is None else min(remaining, 100)
+            await self.api.request("history", self.id)
+            lo = bisect.bisect_right(self._ids, lo_id)
+            hi = bisect.bisect_left(self._ids, hi_id)
+            ids = self._ids[lo:min(hi, lo + n)] if oldest_first else self._ids[max(lo, hi - n):hi][::-1]
+            for id in ids:
+                if id in self._messages: yield self._messages[id]
+            if len(ids) < n: return
+            if oldest_first: lo_id = ids[-1]
+            else: hi_id = ids[-1]
+            if remaining is not None: remaining -= len(ids)
+
+    async def purge(self, limit=100):
+        """直近 limit 件を1回の履歴取得とまとめて削除で消す"""
+        await self.api.request("history", self.id)
+        ids = self._ids[-limit:]
+        if len(ids) >= 2: await self.api.request("bulk_delete", self.id)
+        elif ids: await self.api.request("delete", self.id)
+        deleted = [self._messages[i] for i in ids]
+        for id in ids:
+            self.remove(id)
+        return deleted
+
+class FakeCategory:
+    def __init__(self, guild, id, name):
+        self.guild = guild
+        self.id = id
+        self.name = name
+
+class FakeGuild:
+    def __init__(self, api, id, name="bench", me=None):
+        self.api = api
+        self.id = id
+        self.name = name
+        self.me = me or FakeUser(1, "bot", bot=True)
+        self.default_role = FakeUser(id, "@everyone")
+        self.text_channels = []
+        self.categories = []
+        self.members = []
+
+    def get_channel(self, id):
+        return next((c for c in self.text_channels if c.id == id), None)
+
+    async def create_text_channel(self, name, category=None, overwrites=None, **kwargs):
+        await self.api.request("create_channel", self.id)
+        channel = FakeTextChannel(self, self.api.next_id(), name, category)
+        self.text_channels.append(channel)
+        return channel
+
+    async def create_category(self, name, overwrites=None, **kwargs):
+        await self.api.request("create_channel", self.id)
+        category = FakeCategory(self, self.api.next_id(), name)
+        self.categories.append(category)
+        return category
+
+class FakeBot:
+    def __init__(self, api, user=None):
+        self.api = api
+        self.user = user or FakeUser(1, "bot", bot=True)
+        self.guilds = []
+
+    def add_guild(self, id, name="bench"):
+        guild = FakeGuild(self.api, id, name, self.user)
+        self.guilds.append(guild)
+        return guild
+
+class FakeInteractionResponse:
+    def __init__(self, api):
+        self.api = api
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self, files=()):
+        if self.done: raise discord.InteractionResponded(None)
+        await self.api.request("respond", None, file_bytes(files))
+        self.done = True
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def send_message(self, content=None, *, file=None, files=None, **kwargs):
+        await self._respond(([file] if file else []) + list(files or []))
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+
+class FakeFollowup:
+    def __init__(self, api):
+        self.api = api
+        self.sent = []
+
+    async def send(self, content=None, *, file=None, files=None, **kwargs):
+        await self.api.request("followup", None, file_bytes(([file] if file else []) + list(files or [])))
+        self.sent.append((content, kwargs))
+
+class FakeInteraction:
+    def __init__(self, guild, channel, user, message=None):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.user = user
+        self.message = message
+        self.response = FakeInteractionResponse(guild.api)
+        self.followup = FakeFollowup(guild.api)
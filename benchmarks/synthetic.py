@@ -0,0 +1,63 @@
+"""ベンチマーク用の合成ログ (Bot が保存するのと同じ形の log_data 辞書) を作る"""
+import datetime
+import random
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+# タスク名: (出現の重み, 始まる時間帯 (時) の候補, 所要時間 (分) の範囲)
+TASK_MIX = {
+    "勉強": (30, [9, 10, 13, 14, 15, 20, 21, 22], (25, 180)),
+    "読書": (12, [7, 12, 21, 22, 23], (15, 90)),
+    "運動": (8, [6, 7, 17, 18], (20, 70)),
+    "食事": (20, [7, 12, 19], (15, 45)),
+    "風呂": (10, [21, 22, 23], (10, 40)),
+    "コーヒー": (10, [8, 10, 15], (5, 20)),
+    "ゲーム": (6, [20, 22, 23], (30, 150)),
+    "散歩": (4, [6, 16, 17], (15, 60)),
+}
+MEMOS = ["", "", "", "集中できた", "眠い", "第3章まで", "5km", "復習", "新しい店", "途中で中断"]
+
+def default_days(n):
+    """行数に応じた期間: 1日あたり20件 (複数人のサーバー) を目安に、30日〜10年"""
+    return min(max(n // 20, 30), 3650)
+
+def generate_logs(n, days=None, end=None, seed=0):
+    """n 件のログを古い順に返す。timestamp は終了時刻 (JST)、日付をまたぐログも含む"""
+    rng = random.Random(seed)
+    days = days or default_days(n)
+    end = end or datetime.datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = end - datetime.timedelta(days=days)
+    names = list(TASK_MIX)
+    weights = [TASK_MIX[name][0] for name in names]
+    logs = []
+    for task in rng.choices(names, weights, k=n):
+        _, hours, (low, high) = TASK_MIX[task]
+        start = first_day + datetime.timedelta(
+            days=rng.randrange(days), hours=rng.choice(hours), minutes=rng.randrange(60)
+        )
+        minutes = rng.randint(low, high)
+        seconds = rng.randrange(60)
+        end_time = start + datetime.timedelta(minutes=minutes, seconds=seconds)
+        logs.append({
+            "task": task,
+            "duration_min": minutes,
+            "duration_str": f"{minutes}分 {seconds}秒",
+            "memo": rng.choice(MEMOS),
+            "date": end_time.strftime("%Y-%m-%d"),
+            "timestamp": end_time.isoformat(),
+        })
+    logs.sort(key=lambda log: log["timestamp"])
+    return logs
+
+def generate_goals():
+    """目標設定 (日・週・月・期間指定) の例"""
+    created_at = (datetime.datetime.now(JST) - datetime.timedelta(days=10)).isoformat()
+    return {
+        "勉強": [
+            {"target": 120, "period": "daily"},
+            {"target": 900, "period": "weekly"},
+            {"target": 3000, "period": "custom", "custom_days": 30, "created_at": created_at},
+        ],
+        "運動": [{"target": 240, "period": "weekly"}],
+        "読書": [{"target": 600, "period": "monthly"}],
+    }
@@ -1,38 +1,220 @@
+import time
+# 起動時間の計測用 (import の開始時刻)
+STARTED_AT = time.perf_counter()
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
 import datetime
 import json
 import asyncio
-from flask import Flask
+from aiohttp import web
 from threading import Thread
-from collections import defaultdict, Counter
+import threading
+from collections import defaultdict, Counter, OrderedDict, deque
 import io
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.font_manager as fm
-import matplotlib.patches as patches
-import pandas as pd
+import importlib
+import functools
 import random
+import traceback
+import sys
+import logging
+from logging.handlers import RotatingFileHandler
+import sqlite3
+import bisect
+import copy
+import contextlib
+import contextvars
+import inspect
+import gzip
 import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class _LazyModule:
+    """属性に初めて触れたときに import するモジュールの代わり (グラフ用の重いライブラリを起動時に読まないため)"""
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+            if self._on_load: self._on_load()
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+# matplotlib はどれかを読んだ時点でフォントを設定する
+matplotlib = _LazyModule("matplotlib", on_load=lambda: setup_fonts())
+mimage = _LazyModule("matplotlib.image", on_load=lambda: setup_fonts())
+mfigure = _LazyModule("matplotlib.figure", on_load=lambda: setup_fonts())
+backend_agg = _LazyModule("matplotlib.backends.backend_agg", on_load=lambda: setup_fonts())
+fm = _LazyModule("matplotlib.font_manager", on_load=lambda: setup_fonts())
+patches = _LazyModule("matplotlib.patches", on_load=lambda: setup_fonts())
+mcollections = _LazyModule("matplotlib.collections", on_load=lambda: setup_fonts())
+pd = _LazyModule("pandas")
+CHART_MODULES = [matplotlib, mimage, mfigure, backend_agg, fm, patches, mcollections, pd]
 
 # ---------------------------------------------------------
 # 1. サーバー維持機能
 # ---------------------------------------------------------
-app = Flask('')
-
-@app.route('/')
-def home():
-    return "I am alive!"
-
-def run():
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host='0.0.0.0', port=port)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+# Bot と同じイベントループで動く HTTP サーバー (死活監視と内部状態の確認用)
+http_runner = None
+# イベントループの遅れ (秒): LOOP_LAG_INTERVAL ごとの sleep がどれだけ遅れて戻ったか
+loop_lag = {"last": 0.0, "max": 0.0}
+loop_lag_samples = deque(maxlen=600)
+# ループが止まったことの検知 (LoopWatchdog) と、その回数・最後の1件
+loop_watchdog = None
+block_stats = {"count": 0, "last": None}
+
+async def http_home(request):
+    return web.Response(text="I am alive!")
+
+async def http_healthz(request):
+    latency = client.latency
+    last = interaction_stats["last"]
+    healthy = (
+        client.is_ready() and not client.is_closed()
+        and latency == latency and latency != float("inf")
+        and loop_lag["last"] < HEALTH_MAX_LOOP_LAG
+    )
+    # 1件のインタラクションの失敗は Bot 全体の不調ではないので、状態には含めず本文で知らせるだけにする
+    body = {
+        "status": "ok" if healthy else "unhealthy",
+        "ready": client.is_ready(),
+        "gateway_latency_ms": round(latency * 1000, 1) if latency == latency and latency != float("inf") else None,
+        "loop_lag_ms": round(loop_lag["last"] * 1000, 1),
+        "last_interaction": last,
+    }
+    return web.json_response(body, status=200 if healthy else 503)
+
+async def http_metrics(request):
+    return web.json_response(collect_metrics())
+
+async def http_timings(request):
+    return web.json_response(timing_report())
+
+def collect_metrics():
+    """キャッシュの大きさ・待ち行列の長さ・描画時間などの内部状態"""
+    return {
+        "uptime_sec": round(time.perf_counter() - STARTED_AT, 1),
+        "guilds": len(client.guilds),
+        "loop_lag_ms": {
+            **{k: round(v * 1000, 1) for k, v in loop_lag.items()},
+            "p99": round(float(np.percentile(np.fromiter(loop_lag_samples, float), 99)) * 1000, 1) if loop_lag_samples else 0.0,
+        },
+        "loop_blocks": block_stats,
+        "caches": {
+            "log_guilds": sum(1 for c in log_caches.values() if c.loaded),
+            "log_entries": sum(len(c.entries) for c in log_caches.values()),
+            "config_guilds": sum(1 for c in config_caches.values() if c.loaded),
+            "open_log_pages": len(log_pages),
+            "images": render_cache.stats(),
+        },
+        "queues": {
+            "background_tasks": len(background_tasks),
+            "goals_panel_pending": len(goals_panel_refresher.pending),
+            "dashboard_pending": len(dashboard_mover.pending),
+            "renders_in_flight": render_stats["in_flight"],
+        },
+        "render": {k: v for k, v in render_stats.items() if k != "in_flight"},
+        "interactions": {k: v for k, v in interaction_stats.items() if k != "last"},
+        "startup": startup_stats,
+    }
+
+async def monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        if loop_watchdog: loop_watchdog.beat()
+        loop_lag["last"] = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+        loop_lag["max"] = max(loop_lag["max"], loop_lag["last"])
+        loop_lag_samples.append(loop_lag["last"])
+
+class LoopWatchdog:
+    """イベントループが threshold 秒以上戻ってこなかったら、別スレッドからループのスタックを記録する"""
+    def __init__(self, threshold, path):
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self.thread_id = None
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger("loop_watchdog")
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=BLOCK_LOG_BYTES, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+
+    def beat(self):
+        self.heartbeat = time.monotonic()
+
+    def start(self):
+        """イベントループのスレッドから呼ぶ"""
+        self.thread_id = threading.get_ident()
+        self.beat()
+        Thread(target=self.run, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        stalled = None
+        while not self.stop_event.wait(min(self.threshold / 4, 0.1)):
+            beat = self.heartbeat
+            blocked = time.monotonic() - beat - LOOP_LAG_INTERVAL
+            if stalled is not None and beat != stalled["beat"]:
+                # ループが戻ってきた: 止まっていた時間の合計を記録する
+                self.write({"event": "recovered", "handler": stalled["handler"],
+                            "blocked_ms": round((beat - stalled["beat"] - LOOP_LAG_INTERVAL) * 1000, 1)})
+                stalled = None
+            if stalled is None and blocked >= self.threshold:
+                stalled = self.sample(beat, blocked)
+
+    def sample(self, beat, blocked):
+        frame = sys._current_frames().get(self.thread_id)
+        handlers = []
+        innermost = None
+        f = frame
+        while f is not None:
+            code = f.f_code
+            if code.co_qualname in timed_names: handlers.append(code.co_qualname)
+            if innermost is None and code.co_filename == __file__: innermost = code.co_qualname
+            f = f.f_back
+        handlers.reverse()
+        handler = handlers[-1] if handlers else (innermost or "unknown")
+        block_stats["count"] += 1
+        block_stats["last"] = {"handler": handler, "blocked_ms": round(blocked * 1000, 1), "at": datetime.datetime.now(JST).isoformat()}
+        print(f"【警告】イベントループが {blocked:.2f}秒 止まっています ({handler})")
+        self.write({"event": "blocked", "handler": handler, "handlers": handlers, "blocked_ms": round(blocked * 1000, 1),
+                    "stack": traceback.format_stack(frame) if frame is not None else []})
+        return {"beat": beat, "handler": handler}
+
+    def write(self, record):
+        record["at"] = datetime.datetime.now(JST).isoformat()
+        self.logger.info(json.dumps(record, ensure_ascii=False))
+
+async def start_http_server():
+    global http_runner
+    app = web.Application()
+    app.router.add_get("/", http_home)
+    app.router.add_get("/healthz", http_healthz)
+    app.router.add_get("/metrics", http_metrics)
+    app.router.add_get("/timings", http_timings)
+    http_runner = web.AppRunner(app, access_log=None)
+    await http_runner.setup()
+    await web.TCPSite(http_runner, "0.0.0.0", int(os.environ.get("PORT", 8080))).start()
+
+async def stop_http_server():
+    global http_runner
+    if http_runner is None: return
+    await http_runner.cleanup()
+    http_runner = None
 
 # ---------------------------------------------------------
 # 2. 設定・定数
@@ -47,9 +229,47 @@ CH_GOALS = "🎯目標管理"
 CH_REPORT = "📊レポート"
 CAT_NAME = "MY LIFE LOG"
 
+# 設定メッセージ (データ保存用チャンネルにピン留め) のプレフィックス
+CONFIG_TASKS_PREFIX = "CONFIG_TASKS:"
+CONFIG_GOALS_PREFIX = "CONFIG_GOALS:"
+
+# ローカルログストア (SQLite) のパス
+LOG_DB_PATH = os.getenv("LOG_DB_PATH", "mylifelog.db")
+# ログの保存形式 ("embed": 1件ごとに埋め込み / "packed": 複数件を1メッセージにまとめて追記)
+LOG_STORAGE_MODE = os.getenv("LOG_STORAGE_MODE", "embed")
+LOG_PAGE_PREFIX = "LOG_PAGE:"
+# まとめページの文字数上限 (Discord のメッセージ上限 2000 文字の少し手前で次のページへ)
+LOG_PAGE_LIMIT = 1900
+# ログ全件の圧縮スナップショット (データ保存用チャンネルにピン留め) と作成間隔 (秒)
+LOG_SNAPSHOT_PREFIX = "LOG_SNAPSHOT:"
+LOG_SNAPSHOT_FILENAME = "logs_snapshot.jsonl.gz"
+LOG_SNAPSHOT_INTERVAL = float(os.getenv("LOG_SNAPSHOT_INTERVAL", 6 * 60 * 60))
+# メモリ上のログキャッシュがチャンネルの差分を確認する間隔 (秒)
+LOG_SYNC_INTERVAL = float(os.getenv("LOG_SYNC_INTERVAL", 60))
+# save_log でストアに書いた分をまとめてコミットするまでの待ち時間 (秒)
+LOG_COMMIT_DELAY = float(os.getenv("LOG_COMMIT_DELAY", 1))
+
+# 目標パネル更新をまとめる待ち時間 (秒)。この間に来た更新要求は1回の更新にまとめる
+GOALS_REFRESH_DELAY = float(os.getenv("GOALS_REFRESH_DELAY", 2))
+# 行動宣言パネルの再設置をまとめる待ち時間 (秒)
+DASHBOARD_MOVE_DELAY = float(os.getenv("DASHBOARD_MOVE_DELAY", 1))
+
+# グラフ描画ワーカーのプロセス数 (0 ならプロセスを使わずスレッドで並行して描画) と1件あたりの制限時間 (秒)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 60))
+# 描画済み画像キャッシュの上限 (バイト)
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", 64 * 1024 * 1024))
+# 統合レポートの横幅の上限 (インチ)。収まらないグラフは次の段に回し、それより広いグラフは縮める
+COMBINED_MAX_WIDTH = float(os.getenv("COMBINED_MAX_WIDTH", 24))
+
 # 日本時間（JST）の定義
 JST = datetime.timezone(datetime.timedelta(hours=9))
 
+# 期間指定でログを読むときの終端側の余裕 (ログ記録からメッセージ送信までのずれ)
+LOG_RANGE_MARGIN = datetime.timedelta(minutes=5)
+# キャッシュ済みのログを集計するときに1回で渡す行数 (その間に他の処理を挟めるように)
+LOG_STREAM_ROWS = 10_000
+
 PRAISE_MESSAGES = [
     "お疲れ様でした！素晴らしい集中力です✨",
     "ナイス！その調子でいきましょう🚀",
@@ -68,46 +288,566 @@ BUTTON_STYLES = {
     "danger": discord.ButtonStyle.danger
 }
 
+# グラフ用ライブラリの読み込み方
+# "preload": 起動後 (on_ready) に裏のスレッドで読む / "lazy": 最初のグラフ作成時に読む / "eager": 起動時に読む
+# 描画ワーカーを使う (RENDER_WORKERS > 0) ときは Bot のプロセスでは描画しないので、preload / eager でも読まない
+STARTUP_MODE = os.getenv("STARTUP_MODE", "preload")
+# 起動時間・最初のグラフ作成にかかった時間 (秒)
+startup_stats = {}
+# /healthz が不調とみなすイベントループの遅れ (秒)
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", 1))
+# イベントループの遅れを測る間隔 (秒)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+# 1つの処理がこの秒数以上ループを止めたらスタックを記録する
+BLOCK_THRESHOLD = float(os.getenv("BLOCK_THRESHOLD", 0.5))
+BLOCK_LOG_PATH = os.getenv("BLOCK_LOG_PATH", "loop_blocks.log")
+BLOCK_LOG_BYTES = 1024 * 1024
+# 処理時間の分布 (p50/p95/p99) を計算するために残す、ハンドラごとの直近の件数
+TIMING_SAMPLES = int(os.getenv("TIMING_SAMPLES", 1000))
+
 FONT_PATH = "font.ttf"
-try:
-    if os.path.exists(FONT_PATH):
-        font_prop = fm.FontProperties(fname=FONT_PATH)
-        plt.rcParams['font.family'] = font_prop.get_name()
-    else:
-        print("【警告】font.ttfが見つかりません。")
-except Exception as e:
-    print(f"フォント設定エラー: {e}")
-
-intents = discord.Intents.default()
-intents.message_content = True
-client = commands.Bot(command_prefix='!', intents=intents)
+fonts_lock = threading.RLock()
+fonts_ready = False
+
+def setup_fonts():
+    """matplotlib の既定フォントを font.ttf にする (最初に matplotlib を読んだときに1度だけ)"""
+    global fonts_ready
+    with fonts_lock:
+        if fonts_ready: return
+        fonts_ready = True
+        try:
+            if os.path.exists(FONT_PATH):
+                font_prop = fm.FontProperties(fname=FONT_PATH)
+                matplotlib.rcParams['font.family'] = font_prop.get_name()
+            else:
+                print("【警告】font.ttfが見つかりません。")
+        except Exception as e:
+            print(f"フォント設定エラー: {e}")
+
+def preload_chart_stack():
+    """グラフ用ライブラリとフォントを読み込んでおく"""
+    started = time.perf_counter()
+    for module in CHART_MODULES:
+        module._load()
+    for size, weight in [(12, 'normal'), (14, 'normal'), (14, 'bold')]:
+        GraphGenerator.get_font_prop(size=size, weight=weight)
+    startup_stats["chart_stack_sec"] = time.perf_counter() - started
+    print(f"グラフ用ライブラリ読み込み完了: {startup_stats['chart_stack_sec']:.2f}秒")
+
+# Bot 本体 (run_bot の create_client で作る。描画ワーカーでは None のまま)
+client = None
 
 # ---------------------------------------------------------
 # 3. 共通ヘルパー関数
 # ---------------------------------------------------------
-async def resend_dashboard(interaction, bot):
-    """ダッシュボードパネルを最下部に再設置する"""
-    dm = DataManager(bot)
-    tasks = await dm.load_tasks(interaction.guild)
-    
+# 実行中のバックグラウンド処理 (参照を保持しておかないと途中で回収されることがある)
+background_tasks = set()
+# インタラクション処理の成否 (last: 最後に終わった処理)
+interaction_stats = {"ok": 0, "error": 0, "last": None}
+# 描画の回数・時間 (秒) と実行中の数
+render_stats = {"count": 0, "errors": 0, "total_sec": 0.0, "max_sec": 0.0, "last_sec": None, "in_flight": 0}
+
+class Span:
+    """実行中のハンドラ1回分の計測 (REST 呼び出し・送信バイト数・描画時間)"""
+    __slots__ = ("name", "parent", "rest", "bytes_up", "render_sec")
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.rest = Counter()
+        self.bytes_up = 0
+        self.render_sec = 0.0
+
+    def chain(self):
+        """自分と呼び出し元のすべて (中で呼んだ処理の分は呼び出し元にも数える)"""
+        span = self
+        while span is not None:
+            yield span
+            span = span.parent
+
+class HandlerStats:
+    """ハンドラごとの処理時間の分布と、REST 呼び出し・送信バイト数・描画時間の合計"""
+    def __init__(self):
+        self.samples = deque(maxlen=TIMING_SAMPLES)
+        self.calls = 0
+        self.errors = 0
+        self.total_sec = 0.0
+        self.rest = Counter()
+        self.bytes_up = 0
+        self.render_sec = 0.0
+
+    def record(self, span, elapsed, ok):
+        self.samples.append(elapsed)
+        self.calls += 1
+        if not ok: self.errors += 1
+        self.total_sec += elapsed
+        self.rest.update(span.rest)
+        self.bytes_up += span.bytes_up
+        self.render_sec += span.render_sec
+
+    def summary(self):
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, float), [50, 95, 99]) * 1000 if self.samples else (0.0, 0.0, 0.0)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(max(self.samples) * 1000, 1) if self.samples else 0.0,
+            "total_sec": round(self.total_sec, 3),
+            "rest_calls": dict(self.rest),
+            "bytes_up": self.bytes_up,
+            "render_sec": round(self.render_sec, 3),
+        }
+
+# 実行中のハンドラの計測 (タスクごとに別々)
+current_span = contextvars.ContextVar("current_span", default=None)
+handler_stats = defaultdict(HandlerStats)
+# timed で包んだ関数の名前 (ループが止まったときのスタックからハンドラを探すため)
+timed_names = set()
+
+def timing_report():
+    """ハンドラごとの計測結果 (合計時間の長い順)"""
+    items = sorted(handler_stats.items(), key=lambda kv: kv[1].total_sec, reverse=True)
+    return {name: stats.summary() for name, stats in items}
+
+def timed(func):
+    """処理時間と、その間の REST 呼び出し・送信バイト数・描画時間をハンドラ名ごとに集計する"""
+    name = func.__qualname__
+    timed_names.add(name)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        span = Span(name, current_span.get())
+        token = current_span.set(span)
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = await func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            current_span.reset(token)
+            handler_stats[name].record(span, time.perf_counter() - started, ok)
+    return wrapper
+
+def timed_methods(cls):
+    """クラスのコルーチンメソッドをすべて timed で包む"""
+    for name, attr in list(vars(cls).items()):
+        if inspect.iscoroutinefunction(attr):
+            setattr(cls, name, timed(attr))
+    return cls
+
+def rest_kind(method, path):
+    """REST 呼び出しの種類 (pins / history / send / edit / delete / ...)"""
+    if path.endswith("/pins") or "/pins/" in path: return "pins"
+    if path == "/channels/{channel_id}/messages": return "history" if method == "GET" else "send"
+    if path.startswith("/webhooks/") or path.startswith("/interactions/"):
+        if path.endswith("/callback"): return "respond"
+        return {"POST": "send", "PATCH": "edit", "DELETE": "delete"}.get(method, "other")
+    if path.startswith("/channels/{channel_id}/messages/"):
+        return {"GET": "fetch", "PATCH": "edit", "DELETE": "delete"}.get(method, "other")
+    return f"{method} {path}"
+
+def file_size(file):
+    """discord.File の中身のバイト数 (読み取り位置は変えない)"""
+    try:
+        fp = file.fp
+        pos = fp.tell()
+        size = fp.seek(0, io.SEEK_END)
+        fp.seek(pos)
+        return size
+    except Exception:
+        return 0
+
+def count_rest_call(route, files):
+    span = current_span.get()
+    if span is None: return
+    kind = rest_kind(route.method, route.path)
+    size = sum(file_size(f) for f in files or ())
+    for s in span.chain():
+        s.rest[kind] += 1
+        s.bytes_up += size
+
+def instrument_http(http):
+    """Bot の REST 呼び出しと、インタラクション応答 (Webhook 経由) を実行中のハンドラに数える"""
+    request = http.request
+
+    async def counted_request(route, *, files=None, **kwargs):
+        count_rest_call(route, files)
+        return await request(route, files=files, **kwargs)
+
+    http.request = counted_request
+
+    adapter = discord.webhook.async_.AsyncWebhookAdapter
+    if getattr(adapter.request, "_counted", False): return
+    webhook_request = adapter.request
+
+    async def counted_webhook_request(self, route, session, *, files=None, **kwargs):
+        count_rest_call(route, files)
+        return await webhook_request(self, route, session, files=files, **kwargs)
+
+    counted_webhook_request._counted = True
+    adapter.request = counted_webhook_request
+
+def tracked(func):
+    """インタラクションの処理が例外で終わったかどうかを記録し、処理時間を計測する"""
+    timed_func = timed(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            result = await timed_func(*args, **kwargs)
+        except Exception as e:
+            interaction_stats["error"] += 1
+            interaction_stats["last"] = {"handler": func.__qualname__, "ok": False, "error": repr(e), "at": datetime.datetime.now(JST).isoformat()}
+            raise
+        interaction_stats["ok"] += 1
+        interaction_stats["last"] = {"handler": func.__qualname__, "ok": True, "at": datetime.datetime.now(JST).isoformat()}
+        return result
+    return wrapper
+
+def run_in_background(coro, label):
+    """応答を待たせない副作用を裏で実行する。失敗したら内容を出力する"""
+    # 裏の処理は呼び出し元のハンドラの計測に含めない (応答後に走るため)
+    context = contextvars.copy_context()
+    context.run(current_span.set, None)
+    task = asyncio.get_running_loop().create_task(coro, context=context)
+    background_tasks.add(task)
+
+    def on_done(t):
+        background_tasks.discard(t)
+        if t.cancelled(): return
+        e = t.exception()
+        if e is not None:
+            print(f"バックグラウンド処理エラー ({label}): {e}")
+            traceback.print_exception(type(e), e, e.__traceback__)
+
+    task.add_done_callback(on_done)
+    return task
+
+class Debouncer:
+    """キーごとに短時間に集中した要求をまとめ、待ち時間の後に1回だけ実行する"""
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = {}
+
+    def schedule(self, key, func, label):
+        """func: 引数なしでコルーチンを返す関数。実行待ちの要求があればそれに相乗りする"""
+        task = self.pending.get(key)
+        if task is not None: return task
+
+        async def runner():
+            await asyncio.sleep(self.delay)
+            # 実行を始めた後の要求は次の回に回す
+            self.pending.pop(key, None)
+            await func()
+
+        task = run_in_background(runner(), label)
+        self.pending[key] = task
+        return task
+
+def to_snowflake(dt, high=False):
+    """日時をメッセージIDの境界に変換する (タイムゾーン無しは JST とみなす)"""
+    if hasattr(dt, "to_pydatetime"):
+        dt = dt.to_pydatetime()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=JST)
+    return discord.utils.time_snowflake(dt, high=high)
+
+def jst_day_start(dt):
+    """その日時の JST での日付の 0 時 (タイムゾーン付き。タイムゾーン無しは JST とみなす)"""
+    if hasattr(dt, "to_pydatetime"):
+        dt = dt.to_pydatetime()
+    dt = dt.astimezone(JST) if dt.tzinfo else dt.replace(tzinfo=JST)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def encode_packed_log(log_data):
+    """ログをまとめページ用の1行 (区切り無しの JSON 配列) に変換する"""
+    ts = int(datetime.datetime.fromisoformat(log_data['timestamp']).timestamp())
+    rec = [ts, log_data['task'], log_data.get('duration_min', 0), log_data.get('duration_str', '')]
+    if log_data.get('memo'):
+        rec.append(log_data['memo'])
+    return json.dumps(rec, ensure_ascii=False, separators=(',', ':'))
+
+def decode_packed_log(line):
+    ts, task, duration_min, duration_str, *rest = json.loads(line)
+    end_time = datetime.datetime.fromtimestamp(ts, JST)
+    return {
+        "task": task,
+        "duration_min": duration_min,
+        "duration_str": duration_str,
+        "memo": rest[0] if rest else "",
+        "date": end_time.strftime("%Y-%m-%d"),
+        "timestamp": end_time.isoformat()
+    }
+
+def encode_snapshot(entries):
+    """(message_id, seq, log_data) のリストを gzip 圧縮した JSON Lines にする"""
+    lines = [json.dumps([mid, seq, data], ensure_ascii=False, separators=(',', ':')) for mid, seq, data in entries]
+    return gzip.compress("\n".join(lines).encode("utf-8"))
+
+def decode_snapshot(raw):
+    text = gzip.decompress(raw).decode("utf-8")
+    return [tuple(json.loads(line)) for line in text.split("\n") if line]
+
+async def resend_dashboard(interaction, bot, rebuild=False):
+    """ダッシュボードパネルを最下部に再設置する (連続した要求は1回にまとめて後で実行する)
+    rebuild: タスクが変わったときなど、最下部にあってもボタンを作り直す"""
     dashboard_ch = discord.utils.get(interaction.guild.text_channels, name=CH_DASHBOARD)
     target_ch = dashboard_ch if dashboard_ch else interaction.channel
-    
-    try:
-        async for msg in target_ch.history(limit=5):
-            if msg.author == bot.user and msg.content == "行動宣言パネル":
-                await msg.delete()
-    except:
-        pass
+    DataManager(bot).schedule_dashboard_move(interaction.guild, target_ch, rebuild)
 
-    try:
-        await target_ch.send("行動宣言パネル", view=DashboardView(bot, tasks))
-    except Exception as e:
-        print(f"パネル再設置エラー: {e}")
+# ---------------------------------------------------------
+# 4. ローカルログストア & キャッシュ
+# ---------------------------------------------------------
+class LogStore:
+    """🔒データ保存用チャンネルのログをミラーするローカル SQLite ストア"""
+    # スキーマを変更したら上げる (古いストアは破棄してチャンネルから再構築する)
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path):
+        self.path = path
+        # 重い読み書きはスレッドで行うので、接続は lock で守って共有する
+        self.lock = threading.RLock()
+        # 最初に使うときに開く (描画ワーカーが main を読み込んだだけではファイルに触らないように)
+        self._conn = None
+
+    @property
+    def conn(self):
+        with self.lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS logs")
+            conn.execute("DROP TABLE IF EXISTS sync_state")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS logs ("
+            "guild_id INTEGER NOT NULL, message_id INTEGER NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (guild_id, message_id, seq))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "guild_id INTEGER PRIMARY KEY, last_message_id INTEGER NOT NULL DEFAULT 0, "
+            "backfilled INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS panels ("
+            "guild_id INTEGER NOT NULL, kind TEXT NOT NULL, channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, "
+            "PRIMARY KEY (guild_id, kind))"
+        )
+        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        conn.commit()
+        return conn
+
+    def is_backfilled(self, guild_id):
+        with self.lock:
+            row = self.conn.execute("SELECT backfilled FROM sync_state WHERE guild_id = ?", (guild_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get_cursor(self, guild_id):
+        """チャンネルから取り込み済みの最新メッセージID (未同期なら0)"""
+        with self.lock:
+            row = self.conn.execute("SELECT last_message_id FROM sync_state WHERE guild_id = ?", (guild_id,)).fetchone()
+        return row[0] if row else 0
+
+    def mark_synced(self, guild_id, last_message_id):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO sync_state (guild_id, last_message_id, backfilled) VALUES (?, ?, 1) "
+                "ON CONFLICT(guild_id) DO UPDATE SET "
+                "last_message_id = MAX(last_message_id, excluded.last_message_id), backfilled = 1",
+                (guild_id, last_message_id)
+            )
+            self.conn.commit()
+
+    def add_logs(self, guild_id, entries, commit=True):
+        """entries: (message_id, seq, log_data) のリスト。seq はまとめページ内の行番号 (1件1メッセージなら0)
+        commit=False なら書くだけで、コミットは後の commit() に任せる"""
+        if not entries: return
+        rows = [(guild_id, mid, seq, json.dumps(data, ensure_ascii=False)) for mid, seq, data in entries]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO logs (guild_id, message_id, seq, data) VALUES (?, ?, ?, ?)", rows)
+            if commit: self.conn.commit()
+
+    def commit(self):
+        with self.lock:
+            if self._conn is not None: self._conn.commit()
+
+    def get_panel(self, guild_id, kind):
+        """Bot が設置したパネルの (channel_id, message_id)。無ければ None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT channel_id, message_id FROM panels WHERE guild_id = ? AND kind = ?", (guild_id, kind)
+            ).fetchone()
+
+    def set_panel(self, guild_id, kind, channel_id, message_id, commit=True):
+        """commit=False なら書くだけで、コミットは後の commit() に任せる"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO panels (guild_id, kind, channel_id, message_id) VALUES (?, ?, ?, ?)",
+                (guild_id, kind, channel_id, message_id)
+            )
+            if commit: self.conn.commit()
+
+    def get_entries(self, guild_id):
+        """(message_id, seq, log_data) を古い順に返す (全件の json.loads があるのでスレッドから呼ぶ)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT message_id, seq, data FROM logs WHERE guild_id = ? ORDER BY message_id, seq",
+                (guild_id,)
+            ).fetchall()
+        return [(mid, seq, json.loads(data)) for mid, seq, data in rows]
+
+class GuildLogCache:
+    """ギルドごとのメモリ上のログキャッシュ (メッセージID順)"""
+    def __init__(self):
+        self.entries = []
+        self.ids = set()
+        self.last_id = 0
+        self.synced_at = 0.0
+        self.loaded = False
+        # ストアから読み込んでいる間に add された分 (読み込みが終わってから足す)
+        self.loading = False
+        self.pending = []
+        # entries と同じ順の列指向表 (先頭から len(table) 行分)
+        self.table = None
+        # タスク×日の集計 (作成後は add で1件ずつ更新)
+        self.rollups = None
+
+    def load(self, entries, last_id):
+        """entries は is_valid_log を満たすものだけ (table の行と entries の位置を揃えるため)"""
+        self.entries = list(entries)
+        self.ids = {(mid, seq) for mid, seq, _ in self.entries}
+        self.last_id = last_id
+        self.synced_at = time.monotonic()
+        self.loaded = True
+        self.loading = False
+        self.table = None
+        self.rollups = None
+        pending, self.pending = self.pending, []
+        self.add(pending)
+
+    def add(self, entries):
+        if not self.loaded:
+            if self.loading: self.pending.extend(entries)
+            return
+        for mid, seq, data in entries:
+            if (mid, seq) in self.ids or not is_valid_log(data): continue
+            self.ids.add((mid, seq))
+            if not self.entries or (mid, seq) > self.entries[-1][:2]:
+                self.entries.append((mid, seq, data))
+            else:
+                bisect.insort(self.entries, (mid, seq, data), key=lambda e: e[:2])
+                self.table = None
+            if self.rollups is not None:
+                self.rollups.add(data)
+
+    def bounds(self, after_id=None, before_id=None):
+        """メッセージIDの範囲 (after_id, before_id) に入る entries のインデックス範囲"""
+        lo = 0 if after_id is None else bisect.bisect_right(self.entries, after_id, key=lambda e: e[0])
+        hi = len(self.entries) if before_id is None else bisect.bisect_left(self.entries, before_id, key=lambda e: e[0])
+        return lo, hi
+
+    def get_table(self):
+        """全件の LogTable。末尾に追加された分だけを解析して継ぎ足す"""
+        if self.table is None:
+            self.table = LogTable.from_logs(data for _, _, data in self.entries)
+        elif len(self.table) < len(self.entries):
+            self.table = self.table.extend(LogTable.from_logs(data for _, _, data in self.entries[len(self.table):]))
+        return self.table
+
+    def get_rollups(self):
+        if self.rollups is None:
+            self.rollups = LogRollups.from_table(self.get_table())
+        return self.rollups
+
+class ImageCache:
+    """描画済み画像の LRU キャッシュ (合計サイズで上限を決める)"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key not in self.items:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return self.items[key][0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes: return
+        if key in self.items:
+            self.bytes -= self.items.pop(key)[1]
+        self.items[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, old_size) = self.items.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "entries": len(self.items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+        }
+
+class GuildConfigCache:
+    """ギルドごとの設定ピン (CONFIG_TASKS / CONFIG_GOALS) のキャッシュ"""
+    def __init__(self):
+        self.loaded = False
+        self.tasks = None
+        self.goals = None
+        # プレフィックス -> ピン留めメッセージのID / 本文
+        self.message_ids = {}
+        self.raw = {}
+        # 最新のログスナップショットの添付ファイル
+        self.snapshot_attachment = None
+
+log_store = LogStore(LOG_DB_PATH)
+log_caches = defaultdict(GuildLogCache)
+config_caches = defaultdict(GuildConfigCache)
+# ギルドごとの同期処理の多重実行防止
+log_sync_locks = defaultdict(asyncio.Lock)
+log_load_locks = defaultdict(asyncio.Lock)
+log_committer = Debouncer(LOG_COMMIT_DELAY)
+
+def schedule_store_commit():
+    """ストアのコミット (fsync) はイベントループを止めるので、LOG_COMMIT_DELAY の間の書き込みをまとめて裏のスレッドで行う"""
+    log_committer.schedule("commit", lambda: asyncio.to_thread(log_store.commit), "ストアのコミット")
+
+def save_panel(guild_id, kind, channel_id, message_id):
+    """設置したパネルを記録する (コミットは schedule_store_commit に任せる)"""
+    log_store.set_panel(guild_id, kind, channel_id, message_id, commit=False)
+    schedule_store_commit()
+# まとめ保存モードで追記中のページ (ギルドID -> [メッセージID, 本文]) と追記の排他
+log_pages = {}
+log_page_locks = defaultdict(asyncio.Lock)
+# ログが増えるたびに上がるギルドごとの版数 (画像キャッシュのキーに含める)
+log_versions = Counter()
+render_cache = ImageCache(RENDER_CACHE_BYTES)
+# 目標パネル更新のまとめ役 (ギルドID ごと)
+goals_panel_refresher = Debouncer(GOALS_REFRESH_DELAY)
+goals_panel_locks = defaultdict(asyncio.Lock)
+# 行動宣言パネル再設置のまとめ役と、作り直しが要求されたギルド
+dashboard_mover = Debouncer(DASHBOARD_MOVE_DELAY)
+dashboard_locks = defaultdict(asyncio.Lock)
+dashboard_rebuilds = set()
 
 # ---------------------------------------------------------
-# 4. データ管理クラス
+# 5. データ管理クラス
 # ---------------------------------------------------------
+@timed_methods
 class DataManager:
     def __init__(self, bot):
         self.bot = bot
@@ -153,94 +893,350 @@ class DataManager:
     async def get_report_channel(self, guild):
         return await self.get_channel_by_name(guild, CH_REPORT)
 
-    async def load_tasks(self, guild):
+    async def load_config(self, guild):
+        """CONFIG_TASKS / CONFIG_GOALS のピンを1回の pins() で読み込み、キャッシュする"""
+        cache = config_caches[guild.id]
+        if cache.loaded: return cache
         channel = await self.get_data_channel(guild)
         pins = await channel.pins()
+        cache.message_ids.clear()
+        cache.raw.clear()
+        cache.snapshot_attachment = None
         for msg in pins:
-            if msg.content.startswith("CONFIG_TASKS:"):
-                try:
-                    data = json.loads(msg.content.replace("CONFIG_TASKS:", ""))
-                    if data and isinstance(data[0], str): 
-                        return [{"name": t, "style": "secondary"} for t in data]
-                    return data
-                except: pass
-        
-        initial_data = self.default_tasks
-        msg = await channel.send(f"CONFIG_TASKS:{json.dumps(initial_data, ensure_ascii=False)}")
-        await msg.pin()
-        return initial_data
+            for prefix in (CONFIG_TASKS_PREFIX, CONFIG_GOALS_PREFIX, LOG_SNAPSHOT_PREFIX):
+                if msg.content.startswith(prefix) and prefix not in cache.message_ids:
+                    cache.message_ids[prefix] = msg.id
+                    cache.raw[prefix] = msg.content
+                    if prefix == LOG_SNAPSHOT_PREFIX and msg.attachments:
+                        cache.snapshot_attachment = msg.attachments[0]
+        cache.tasks = None
+        cache.goals = None
+        cache.loaded = True
+        return cache
+
+    async def write_config(self, guild, prefix, data):
+        """設定メッセージを書き換える (キャッシュ済みのIDを直接編集し、無ければ新規送信してピン留め)"""
+        cache = await self.load_config(guild)
+        channel = await self.get_data_channel(guild)
+        content = f"{prefix}{json.dumps(data, ensure_ascii=False)}"
+        msg_id = cache.message_ids.get(prefix)
+        if msg_id:
+            try:
+                await channel.get_partial_message(msg_id).edit(content=content)
+            except discord.NotFound:
+                msg_id = None
+        if not msg_id:
+            msg = await channel.send(content)
+            await msg.pin()
+            msg_id = msg.id
+        cache.message_ids[prefix] = msg_id
+        cache.raw[prefix] = content
+
+    async def load_tasks(self, guild):
+        cache = await self.load_config(guild)
+        if cache.tasks is None:
+            tasks = None
+            try:
+                data = json.loads(cache.raw[CONFIG_TASKS_PREFIX].replace(CONFIG_TASKS_PREFIX, ""))
+                if data and isinstance(data[0], str):
+                    data = [{"name": t, "style": "secondary"} for t in data]
+                tasks = data
+            except: pass
+            if tasks is None:
+                tasks = self.default_tasks
+                await self.write_config(guild, CONFIG_TASKS_PREFIX, tasks)
+            cache.tasks = tasks
+        return copy.deepcopy(cache.tasks)
 
     async def save_tasks(self, guild, tasks):
-        channel = await self.get_data_channel(guild)
-        pins = await channel.pins()
-        for msg in pins:
-            if msg.content.startswith("CONFIG_TASKS:"):
-                await msg.edit(content=f"CONFIG_TASKS:{json.dumps(tasks, ensure_ascii=False)}")
-                return
-        msg = await channel.send(f"CONFIG_TASKS:{json.dumps(tasks, ensure_ascii=False)}")
-        await msg.pin()
+        await self.write_config(guild, CONFIG_TASKS_PREFIX, tasks)
+        config_caches[guild.id].tasks = copy.deepcopy(tasks)
 
     async def load_goals(self, guild):
-        channel = await self.get_data_channel(guild)
-        pins = await channel.pins()
-        for msg in pins:
-            if msg.content.startswith("CONFIG_GOALS:"):
-                try:
-                    data = json.loads(msg.content.replace("CONFIG_GOALS:", ""))
-                    new_data = {}
-                    for k, v in data.items():
-                        if isinstance(v, dict): new_data[k] = [v]
-                        else: new_data[k] = v
-                    return new_data
-                except: pass
-        return {}
+        cache = await self.load_config(guild)
+        if cache.goals is None:
+            goals = {}
+            try:
+                data = json.loads(cache.raw[CONFIG_GOALS_PREFIX].replace(CONFIG_GOALS_PREFIX, ""))
+                for k, v in data.items():
+                    if isinstance(v, dict): goals[k] = [v]
+                    else: goals[k] = v
+            except: pass
+            cache.goals = goals
+        return copy.deepcopy(cache.goals)
 
     async def save_goals(self, guild, goals):
-        channel = await self.get_data_channel(guild)
-        pins = await channel.pins()
-        for msg in pins:
-            if msg.content.startswith("CONFIG_GOALS:"):
-                await msg.edit(content=f"CONFIG_GOALS:{json.dumps(goals, ensure_ascii=False)}")
-                return
-        msg = await channel.send(f"CONFIG_GOALS:{json.dumps(goals, ensure_ascii=False)}")
-        await msg.pin()
-
-    async def save_log(self, guild, log_data):
-        data_ch = await self.get_data_channel(guild)
-        timeline_ch = await self.get_timeline_channel(guild)
+        await self.write_config(guild, CONFIG_GOALS_PREFIX, goals)
+        config_caches[guild.id].goals = copy.deepcopy(goals)
 
+    @staticmethod
+    def build_log_embed(log_data, footer):
         embed = discord.Embed(title=f"✅ {log_data['task']}", color=discord.Color.green())
         embed.add_field(name="時間", value=f"{log_data['duration_str']}")
         if log_data.get('memo'):
             embed.add_field(name="📝 メモ", value=log_data['memo'], inline=False)
-        embed.set_footer(text="Logged via MyLifeLog")
+        embed.set_footer(text=footer)
         embed.timestamp = datetime.datetime.now(JST)
-        
-        await timeline_ch.send(embed=embed)
+        return embed
+
+    async def save_log(self, guild, log_data):
+        """ログをデータ保存用チャンネルに確実に書き込んでから戻る。タイムライン転記と目標パネル更新は裏で並行して行う"""
+        data_ch = await self.get_data_channel(guild)
+
+        entry = None
+        if LOG_STORAGE_MODE == "packed":
+            entry = await self.append_log_page(guild, data_ch, log_data)
+        if entry is None:
+            embed = self.build_log_embed(log_data, f"LOG_ID:{json.dumps(log_data, ensure_ascii=False)}")
+            msg = await data_ch.send(embed=embed)
+            entry = (msg.id, 0, log_data)
+        if entry[1] > 0:
+            # 既存のまとめページへの追記は編集なので、同期カーソルがページを過ぎていると取り込み直されない。すぐにコミットする
+            await asyncio.to_thread(log_store.add_logs, guild.id, [entry])
+        else:
+            # 新しいメッセージなので、コミット前に落ちても次の同期でチャンネルから取り込み直される
+            log_store.add_logs(guild.id, [entry], commit=False)
+            schedule_store_commit()
+        log_caches[guild.id].add([entry])
+        log_versions[guild.id] += 1
 
-        embed.set_footer(text=f"LOG_ID:{json.dumps(log_data, ensure_ascii=False)}")
-        await data_ch.send(embed=embed)
+        run_in_background(self.mirror_to_timeline(guild, log_data), "タイムライン転記")
+        self.schedule_goals_panel_refresh(guild)
 
-        await self.refresh_goals_panel(guild)
+    async def mirror_to_timeline(self, guild, log_data):
+        timeline_ch = await self.get_timeline_channel(guild)
+        await timeline_ch.send(embed=self.build_log_embed(log_data, "Logged via MyLifeLog"))
+
+    async def append_log_page(self, guild, data_ch, log_data):
+        """まとめページにログを1行追記する。入りきらなければ新しいページを作る (1行が長すぎる場合は None)"""
+        line = encode_packed_log(log_data)
+        if len(LOG_PAGE_PREFIX) + 1 + len(line) > LOG_PAGE_LIMIT: return None
+        log_day = jst_day_start(datetime.datetime.fromisoformat(log_data['timestamp']))
+        async with log_page_locks[guild.id]:
+            page = log_pages.get(guild.id)
+            # 前の日に作ったページには書き足さない (ページIDで期間を絞ったときに取りこぼさないよう、log_range_ids 参照)
+            if page and len(page[1]) + 1 + len(line) <= LOG_PAGE_LIMIT and discord.utils.snowflake_time(page[0]) >= log_day:
+                content = f"{page[1]}\n{line}"
+                try:
+                    await data_ch.get_partial_message(page[0]).edit(content=content)
+                    page[1] = content
+                    return (page[0], content.count("\n") - 1, decode_packed_log(line))
+                except discord.NotFound:
+                    pass
+            content = f"{LOG_PAGE_PREFIX}\n{line}"
+            msg = await data_ch.send(content)
+            log_pages[guild.id] = [msg.id, content]
+            return (msg.id, 0, decode_packed_log(line))
 
-    async def fetch_logs(self, guild, limit=1500):
+    @staticmethod
+    def parse_log_messages(msg):
+        """データ保存用チャンネルのメッセージからログを (seq, log_data) のリストで取り出す"""
+        if msg.content.startswith(LOG_PAGE_PREFIX):
+            logs = []
+            for seq, line in enumerate(msg.content[len(LOG_PAGE_PREFIX):].strip("\n").split("\n")):
+                try: logs.append((seq, decode_packed_log(line)))
+                except: continue
+            return logs
+        if not msg.embeds: return []
+        embed = msg.embeds[0]
+        if not embed.footer.text or "LOG_ID:" not in embed.footer.text: return []
+        try:
+            return [(0, json.loads(embed.footer.text.replace("LOG_ID:", "")))]
+        except: return []
+
+    async def sync_log_store(self, guild, channel=None):
+        """前回の同期以降のログをチャンネルからローカルストアへ取り込む (初回は全件バックフィル)"""
+        async with log_sync_locks[guild.id]:
+            if channel is None:
+                channel = await self.get_data_channel(guild)
+            cursor = log_store.get_cursor(guild.id)
+            entries = []
+            if not cursor:
+                # 初回はスナップショットがあればそれを読み、その後ろだけをチャンネルから読む
+                entries, cursor = await self.load_snapshot(guild)
+            after = discord.Object(id=cursor) if cursor else None
+            last_id = cursor
+            async for msg in channel.history(limit=None, after=after, oldest_first=True):
+                last_id = max(last_id, msg.id)
+                for seq, data in self.parse_log_messages(msg):
+                    entries.append((msg.id, seq, data))
+            await asyncio.to_thread(log_store.add_logs, guild.id, entries)
+            await asyncio.to_thread(log_store.mark_synced, guild.id, last_id)
+            if entries: log_versions[guild.id] += 1
+            cache = log_caches[guild.id]
+            cache.add(entries)
+            if cache.loaded:
+                cache.last_id = max(cache.last_id, last_id)
+                cache.synced_at = time.monotonic()
+            return len(entries)
+
+    async def load_snapshot(self, guild):
+        """ピン留めされたスナップショットを読み、(entries, 対象の最終メッセージID) を返す (無ければ ([], 0))"""
+        cache = await self.load_config(guild)
+        att = cache.snapshot_attachment
+        if att is None: return [], 0
+        try:
+            meta = json.loads(cache.raw[LOG_SNAPSHOT_PREFIX][len(LOG_SNAPSHOT_PREFIX):])
+            entries = decode_snapshot(await att.read())
+        except Exception as e:
+            print(f"スナップショット読込エラー: {e}")
+            return [], 0
+        return entries, meta["upto"]
+
+    async def write_snapshot(self, guild):
+        """ログ全件を圧縮スナップショットとして送信・ピン留めし、古いスナップショットを削除する"""
         channel = await self.get_data_channel(guild)
-        logs = []
-        async for msg in channel.history(limit=limit):
-            if not msg.embeds: continue
-            embed = msg.embeds[0]
-            if not embed.footer.text or "LOG_ID:" not in embed.footer.text: continue
+        # 追記中のページを閉じ、以降のログは必ずスナップショットより後のメッセージに入るようにする
+        async with log_page_locks[guild.id]:
+            log_pages.pop(guild.id, None)
+        await self.sync_log_store(guild, channel)
+        log_cache = await self.get_log_cache(guild)
+        upto = log_cache.last_id
+        lo, hi = log_cache.bounds(None, upto + 1)
+        entries = log_cache.entries[lo:hi]
+
+        config = await self.load_config(guild)
+        old_id = config.message_ids.get(LOG_SNAPSHOT_PREFIX)
+        content = f"{LOG_SNAPSHOT_PREFIX}{json.dumps({'upto': upto, 'count': len(entries)})}"
+        file = discord.File(io.BytesIO(encode_snapshot(entries)), filename=LOG_SNAPSHOT_FILENAME)
+        msg = await channel.send(content, file=file)
+        await msg.pin()
+        if old_id:
             try:
-                data = json.loads(embed.footer.text.replace("LOG_ID:", ""))
-                logs.append(data)
-            except: continue
-        return logs
+                await channel.get_partial_message(old_id).delete()
+            except discord.NotFound:
+                pass
+        config.message_ids[LOG_SNAPSHOT_PREFIX] = msg.id
+        config.raw[LOG_SNAPSHOT_PREFIX] = content
+        config.snapshot_attachment = msg.attachments[0] if msg.attachments else None
+        return upto, len(entries)
+
+    async def snapshot_is_stale(self, guild):
+        """最新のスナップショットより後にログが増えていれば True"""
+        config = await self.load_config(guild)
+        raw = config.raw.get(LOG_SNAPSHOT_PREFIX)
+        upto = json.loads(raw[len(LOG_SNAPSHOT_PREFIX):])["upto"] if raw else 0
+        log_cache = await self.get_log_cache(guild)
+        return bool(log_cache.entries) and log_cache.entries[-1][0] > upto
+
+    async def verify_snapshot(self, guild):
+        """スナップショット + その後ろのメッセージが、チャンネル全件の読み直しと一致するか確かめる"""
+        channel = await self.get_data_channel(guild)
+        snapshot, upto = await self.load_snapshot(guild)
+        tail = []
+        async for msg in channel.history(limit=None, after=discord.Object(id=upto) if upto else None, oldest_first=True):
+            tail += [(msg.id, seq, data) for seq, data in self.parse_log_messages(msg)]
+        full = []
+        async for msg in channel.history(limit=None, oldest_first=True):
+            full += [(msg.id, seq, data) for seq, data in self.parse_log_messages(msg)]
+        key = lambda e: (e[0], e[1], json.dumps(e[2], ensure_ascii=False, sort_keys=True))
+        matched = sorted(map(key, snapshot + tail)) == sorted(map(key, full))
+        return matched, len(snapshot), len(tail), len(full)
+
+    async def get_log_cache(self, guild, sync=True):
+        """ギルドのログキャッシュを返す。初回はストアから読み込み、以降は一定間隔で差分だけ取り込む (sync=False なら取り込まない)"""
+        cache = log_caches[guild.id]
+        if not cache.loaded:
+            async with log_load_locks[guild.id]:
+                if cache.loaded: return cache
+                if not log_store.is_backfilled(guild.id):
+                    await self.sync_log_store(guild)
+                # 全件の json.loads と検査はスレッドで行う (その間の save_log / 同期の分は pending に溜まる)
+                cache.loading = True
+                try:
+                    entries = await asyncio.to_thread(
+                        lambda: [e for e in log_store.get_entries(guild.id) if is_valid_log(e[2])]
+                    )
+                except BaseException:
+                    cache.loading = False
+                    cache.pending.clear()
+                    raise
+                cache.load(entries, log_store.get_cursor(guild.id))
+        elif sync and time.monotonic() - cache.synced_at >= LOG_SYNC_INTERVAL:
+            await self.sync_log_store(guild)
+        return cache
+
+    @staticmethod
+    def log_range_ids(start=None, end=None):
+        # まとめページのログはページ (最初の1行を書いた時刻) の ID で並ぶ。ページは JST の日付ごとに作り直すので、
+        # 始端をその日の 0 時まで広げれば、同じ日の早い時刻に作られたページのログも取りこぼさない
+        after_id = to_snowflake(jst_day_start(start)) if start is not None else None
+        # ログの timestamp はメッセージ送信より少し前なので、終端は余裕を持たせる
+        before_id = to_snowflake(end + LOG_RANGE_MARGIN, high=True) if end is not None else None
+        return after_id, before_id
+
+    async def iter_log_pages(self, guild, start=None, end=None):
+        """期間内のログを古い順に、少しずつ LogTable にして返す非同期ジェネレータ (全件をまとめずに集計するため)
+        バックフィル前で期間の指定があれば、チャンネルの1ページ (100件) を読むごとに返す。それ以外はキャッシュの表を区切って返す"""
+        after_id, before_id = self.log_range_ids(start, end)
+        if (start is not None or end is not None) and not log_store.is_backfilled(guild.id):
+            channel = await self.get_data_channel(guild)
+            builder, count = LogTable._Builder(), 0
+            async for msg in channel.history(
+                limit=None,
+                after=discord.Object(id=after_id) if after_id else None,
+                before=discord.Object(id=before_id) if before_id else None,
+                oldest_first=True,
+            ):
+                for _, data in self.parse_log_messages(msg):
+                    builder.add(data)
+                count += 1
+                if count % 100 == 0:
+                    yield builder.build().select(start, end)
+                    builder = LogTable._Builder()
+            yield builder.build().select(start, end)
+            return
+        cache = await self.get_log_cache(guild)
+        lo, hi = cache.bounds(after_id, before_id)
+        table = cache.get_table()
+        for i in range(lo, max(hi, lo + 1), LOG_STREAM_ROWS):
+            # メッセージIDの範囲は広めに取っているので、ログ自身の時刻で絞り直す
+            yield table.take(slice(i, min(i + LOG_STREAM_ROWS, hi))).select(start, end)
+
+    async def read_log_table(self, guild, start=None, end=None):
+        """バックフィル前に、期間内のメッセージだけをチャンネルからページ単位 (100件) で読んで列に詰める"""
+        return LogTable.concat([page async for page in self.iter_log_pages(guild, start, end)])
+
+    async def aggregate_report(self, guild, chart_types, start=None, end=None, tasks_filter=None):
+        """レポートの集計を、ログを少しずつ読みながら進める。戻り値: ({グラフの種類: 集計}, 表)
+        表は個々のログが要るタイムラインを選んだときだけ作る (それ以外は None)"""
+        aggregates = {c: GraphGenerator.new_aggregator(c) for c in chart_types if c in REPORT_AGGREGATORS}
+        pages = [] if "timeline" in chart_types else None
+        async for page in self.iter_log_pages(guild, start, end):
+            page = page.select(tasks_filter=tasks_filter)
+            for agg in aggregates.values():
+                agg.add_table(page)
+            if pages is not None: pages.append(page)
+        return aggregates, (LogTable.concat(pages) if pages is not None else None)
+
+    async def fetch_table(self, guild, start=None, end=None):
+        """期間内のログを LogTable で返す。キャッシュ済みなら共有の表を切り出すだけで文字列を解析しない"""
+        if start is None and end is None:
+            return (await self.get_log_cache(guild)).get_table()
+        if not log_store.is_backfilled(guild.id):
+            table = await self.read_log_table(guild, start, end)
+        else:
+            cache = await self.get_log_cache(guild)
+            lo, hi = cache.bounds(*self.log_range_ids(start, end))
+            table = cache.get_table().take(slice(lo, hi))
+        # メッセージIDの範囲は広めに取っているので、ログ自身の時刻で絞り直す
+        return table.select(start, end)
+
+    def schedule_goals_panel_refresh(self, guild):
+        """目標パネルの更新を予約する。短時間に続いた要求は GOALS_REFRESH_DELAY 後の1回の更新にまとめる"""
+        return goals_panel_refresher.schedule(guild.id, lambda: self.refresh_goals_panel(guild), "目標パネル更新")
 
     async def refresh_goals_panel(self, guild):
+        """目標パネルを今すぐ更新する。設置済みのメッセージは編集し、無くなっていれば作り直す"""
         goals_ch = await self.get_goals_channel(guild)
         if not goals_ch: return
+        # 予約分とボタンからの更新が重なってパネルが二重に作られないようにする
+        async with goals_panel_locks[guild.id]:
+            await self._render_goals_panel(guild, goals_ch)
 
-        logs = await self.fetch_logs(guild, limit=1000)
+    async def _render_goals_panel(self, guild, goals_ch):
+        # 進捗は save_log で更新される集計から出すので、ログの読み込みは不要
+        rollups = (await self.get_log_cache(guild, sync=False)).get_rollups()
         goals = await self.load_goals(guild)
         
         embed = discord.Embed(title="🔥 目標進捗ダッシュボード", description="設定された目標の達成状況です。", color=discord.Color.orange())
@@ -248,7 +1244,7 @@ class DataManager:
         if not goals:
             embed.description = "目標が設定されていません。下のボタンから追加してください。"
         else:
-            progress_data = GraphGenerator.calculate_progress(logs, goals)
+            progress_data = GraphGenerator.calculate_progress(rollups, goals)
             if not progress_data:
                 embed.description = "データ不足のため表示できません。"
             else:
@@ -264,298 +1260,789 @@ class DataManager:
                         inline=False
                     )
         
-        await goals_ch.purge(limit=5)
         tasks = await self.load_tasks(guild)
-        await goals_ch.send(embed=embed, view=GoalManagePanel(self.bot, tasks))
+        view = GoalManagePanel(self.bot, tasks)
+        panel = log_store.get_panel(guild.id, "goals")
+        if panel and panel[0] == goals_ch.id:
+            try:
+                await goals_ch.get_partial_message(panel[1]).edit(embed=embed, view=view)
+                return
+            except discord.NotFound:
+                pass
+        await goals_ch.purge(limit=5)
+        msg = await goals_ch.send(embed=embed, view=view)
+        save_panel(guild.id, "goals", goals_ch.id, msg.id)
+
+    def schedule_dashboard_move(self, guild, channel, rebuild=False):
+        """行動宣言パネルの再設置を予約する"""
+        if rebuild: dashboard_rebuilds.add(guild.id)
+        return dashboard_mover.schedule(guild.id, lambda: self.move_dashboard(guild, channel), "パネル再設置")
+
+    async def move_dashboard(self, guild, channel):
+        """行動宣言パネルを最下部に置き直す。既に最下部にあれば何もしない"""
+        async with dashboard_locks[guild.id]:
+            rebuild = guild.id in dashboard_rebuilds
+            dashboard_rebuilds.discard(guild.id)
+            panel = log_store.get_panel(guild.id, "dashboard")
+            tracked = panel is not None and panel[0] == channel.id
+
+            # last_message_id は Gateway で更新されるので、後に投稿があったかは API を呼ばずに分かる
+            if tracked and (channel.last_message_id is None or channel.last_message_id <= panel[1]):
+                if not rebuild: return
+                tasks = await self.load_tasks(guild)
+                try:
+                    await channel.get_partial_message(panel[1]).edit(view=DashboardView(self.bot, tasks))
+                    return
+                except discord.NotFound:
+                    pass
+
+            tasks = await self.load_tasks(guild)
+            msg = await channel.send("行動宣言パネル", view=DashboardView(self.bot, tasks))
+            save_panel(guild.id, "dashboard", channel.id, msg.id)
+
+            # 古いパネルの削除
+            try:
+                if tracked:
+                    await channel.get_partial_message(panel[1]).delete()
+                else:
+                    # ID を記録していない頃のパネルは直近の履歴から探す
+                    async for old in channel.history(limit=5):
+                        if old.id != msg.id and old.author == self.bot.user and old.content == "行動宣言パネル":
+                            await old.delete()
+            except discord.HTTPException:
+                pass
 
 # ---------------------------------------------------------
-# 5. グラフ & 進捗計算クラス
+# 6. 列指向ログ表 & 集計
 # ---------------------------------------------------------
-class GraphGenerator:
+JST_OFFSET_SEC = 9 * 60 * 60
+
+def parse_log_epoch(log):
+    """ログの記録時刻を epoch 秒で返す (timestamp が無い古いログは日付の 0 時 JST)"""
+    if log.get('timestamp'):
+        return int(datetime.datetime.fromisoformat(log['timestamp']).timestamp())
+    return int(datetime.datetime.fromisoformat(log['date']).replace(tzinfo=JST).timestamp())
+
+def is_valid_log(log):
+    """LogTable の1行にできるログか (task と記録時刻が読めるもの)"""
+    try:
+        parse_log_epoch(log)
+        log['task']
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+def to_epoch(dt):
+    """日時を epoch 秒に変換する (タイムゾーン無しは JST とみなす)"""
+    if hasattr(dt, "to_pydatetime"):
+        dt = dt.to_pydatetime()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=JST)
+    return int(dt.timestamp())
+
+def parse_date_input(text):
+    """入力された日付 (YYYY-MM-DD / YYYY/MM/DD) をその日の 0 時にする"""
+    return datetime.datetime.strptime(text.strip().replace('/', '-'), "%Y-%m-%d")
+
+class LogTable:
+    """ログの列指向表現。タスクは整数コード、時刻は epoch 秒 (int64)、時間は分 (int32)、メモは別配列で持つ"""
+    def __init__(self, tasks, task, ts, duration, memo):
+        self.tasks = tasks          # コード -> タスク名
+        self.task = task
+        self.ts = ts
+        self.duration = duration
+        self.memo = memo
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def from_logs(cls, logs):
+        builder = cls._Builder()
+        for log in logs:
+            builder.add(log)
+        return builder.build()
+
+    class _Builder:
+        def __init__(self):
+            self.codes = {}
+            self.task, self.ts, self.duration, self.memo = [], [], [], []
+        def add(self, log):
+            # is_valid_log と同じ判定 (解析を1回で済ませるため中身を展開している)
+            try:
+                ts, task = parse_log_epoch(log), log['task']
+            except (KeyError, ValueError, TypeError, AttributeError):
+                return
+            self.task.append(self.codes.setdefault(task, len(self.codes)))
+            self.ts.append(ts)
+            self.duration.append(log.get('duration_min', 0))
+            self.memo.append(log.get('memo') or "")
+        def build(self):
+            memo = np.empty(len(self.memo), dtype=object)
+            memo[:] = self.memo
+            return LogTable(
+                list(self.codes), np.array(self.task, dtype=np.int32), np.array(self.ts, dtype=np.int64),
+                np.array(self.duration, dtype=np.int32), memo
+            )
+
+    def take(self, index):
+        """slice / bool マスク / インデックス配列で行を取り出す"""
+        return LogTable(self.tasks, self.task[index], self.ts[index], self.duration[index], self.memo[index])
+
+    def extend(self, other):
+        """末尾に other の行を足した新しい表を返す (タスクコードは統合し直す)"""
+        return LogTable.concat([self, other])
+
     @staticmethod
-    def _prepare_df(logs, start_date=None, end_date=None, tasks_filter=None):
-        if not logs: return None
-        df = pd.DataFrame(logs)
-        if df.empty: return None
-        
-        df['date_obj'] = pd.to_datetime(df['date']).dt.tz_localize(None) 
-        
-        if 'timestamp' in df.columns:
-             df['ts_obj'] = pd.to_datetime(df['timestamp']).dt.tz_convert(JST).dt.tz_localize(None)
-        else:
-             df['ts_obj'] = df['date_obj']
+    def concat(tables):
+        """表を順につないだ1つの表 (タスクコードは統合し直す)"""
+        if not tables: return LogTable.from_logs([])
+        codes = {}
+        task = []
+        for t in tables:
+            remap = np.array([codes.setdefault(name, len(codes)) for name in t.tasks] or [0], dtype=np.int32)
+            task.append(remap[t.task])
+        return LogTable(
+            list(codes),
+            np.concatenate(task),
+            np.concatenate([t.ts for t in tables]),
+            np.concatenate([t.duration for t in tables]),
+            np.concatenate([t.memo for t in tables])
+        )
 
-        if start_date:
-            df = df[df['ts_obj'] >= start_date]
-        if end_date:
-            df = df[df['ts_obj'] <= end_date]
-            
+    def task_code(self, name):
+        return self.tasks.index(name) if name in self.tasks else -1
+
+    def mask(self, start=None, end=None, tasks_filter=None):
+        """期間 (JST, 両端含む) とタスクで絞るための bool マスク"""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.ts >= to_epoch(start)
+        if end is not None:
+            mask &= self.ts <= to_epoch(end)
         if tasks_filter:
-            df = df[df['task'].isin(tasks_filter)]
-            
-        if df.empty: return None
-        return df
+            codes = [self.task_code(name) for name in tasks_filter]
+            mask &= np.isin(self.task, codes)
+        return mask
+
+    def select(self, start=None, end=None, tasks_filter=None):
+        return self.take(self.mask(start, end, tasks_filter))
+
+    def task_names(self):
+        """各行のタスク名 (object 配列)"""
+        names = np.empty(len(self.tasks), dtype=object)
+        names[:] = self.tasks
+        return names[self.task]
+
+    def local_ts(self):
+        """JST の壁時計に合わせた epoch 秒 (日付・曜日・時間帯の計算用)"""
+        return self.ts + JST_OFFSET_SEC
+
+    def to_frame(self):
+        """GraphGenerator 用の DataFrame (ts_obj は JST のタイムゾーン無し)"""
+        ts_obj = pd.to_datetime(self.local_ts(), unit='s')
+        return pd.DataFrame({
+            "task": self.task_names(),
+            "duration_min": self.duration,
+            "memo": self.memo,
+            "ts_obj": ts_obj,
+        })
+
+class LogRollups:
+    """タスク×JST日ごとの合計時間。目標進捗をログを読まずに求めるため、1件ごとに O(1) で更新する"""
+    def __init__(self):
+        self.minutes = defaultdict(Counter)   # タスク名 -> {1970-01-01 からの日数: 分}
+        self.count = 0
+
+    def __bool__(self):
+        return self.count > 0
+
+    @staticmethod
+    def day_of(dt):
+        """日時 (タイムゾーン無しは JST) の JST 日付を 1970-01-01 からの日数で返す"""
+        return (to_epoch(dt) + JST_OFFSET_SEC) // 86400
+
+    @classmethod
+    def from_table(cls, table):
+        rollups = cls()
+        if not len(table): return rollups
+        days = table.local_ts() // 86400
+        keys, inverse = np.unique(np.stack([table.task.astype(np.int64), days]), axis=1, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=table.duration, minlength=keys.shape[1])
+        for (code, day), total in zip(keys.T, sums):
+            rollups.minutes[table.tasks[code]][int(day)] += int(total)
+        rollups.count = len(table)
+        return rollups
+
+    def add(self, log):
+        try:
+            day = (parse_log_epoch(log) + JST_OFFSET_SEC) // 86400
+        except (KeyError, ValueError):
+            return
+        self.minutes[log['task']][day] += log.get('duration_min', 0)
+        self.count += 1
+
+    def total(self, task_name, first_day, last_day):
+        """first_day〜last_day (両端含む) の合計時間"""
+        days = self.minutes.get(task_name)
+        if not days: return 0
+        if last_day - first_day + 1 <= len(days):
+            return sum(days.get(d, 0) for d in range(first_day, last_day + 1))
+        return sum(v for d, v in days.items() if first_day <= d <= last_day)
+
+class TaskTotals:
+    """タスク別の合計時間 (円グラフ用)"""
+    def __init__(self):
+        self.totals = Counter()
+    def add_table(self, table):
+        if not len(table): return self
+        sums = np.bincount(table.task, weights=table.duration, minlength=len(table.tasks))
+        for code in np.unique(table.task):
+            self.totals[table.tasks[code]] += int(sums[code])
+        return self
+    def result(self):
+        if not self.totals: return None
+        return pd.Series(self.totals).sort_index()
+
+class DailyTotals:
+    """日付×タスク別の合計時間 (積み上げ棒グラフ用)"""
+    def __init__(self):
+        self.totals = defaultdict(Counter)
+    def add_table(self, table):
+        if not len(table): return self
+        days = table.local_ts() // 86400
+        keys, inverse = np.unique(np.stack([days, table.task]), axis=1, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=table.duration, minlength=keys.shape[1])
+        epoch = datetime.date(1970, 1, 1)
+        for (day, code), total in zip(keys.T, sums):
+            date_str = (epoch + datetime.timedelta(days=int(day))).strftime("%Y-%m-%d")
+            self.totals[date_str][table.tasks[code]] += int(total)
+        return self
+    def result(self):
+        if not self.totals: return None
+        df = pd.DataFrame.from_dict(self.totals, orient='index').fillna(0).astype(int)
+        return df.sort_index().sort_index(axis=1)
+
+class WeekHourGrid:
+    """曜日×時間帯の 7×24 集計 (mode='count': 回数 / 'sum': 合計時間 / 'mean': 平均時間)
+    span=True なら何時間にもわたるログを、かかっている全ての時間帯に (その時間帯にかかった分だけ) 振り分ける。
+    False なら終了時刻の時間帯にまとめて数える"""
+    def __init__(self, mode='count', span=False):
+        self.mode = mode
+        self.span = span
+        self.counts = np.zeros(7 * 24)
+        self.sums = np.zeros(7 * 24)
+        self.seen = False
 
     @staticmethod
+    def cell_index(local_hours):
+        """JST の 1970-01-01 0時からの通し時間 -> 曜日(月=0)*24 + 時 (1970-01-01 は木曜)"""
+        return ((local_hours // 24 + 3) % 7) * 24 + local_hours % 24
+
+    def add_table(self, table):
+        if not len(table): return self
+        self.seen = True
+        end = table.local_ts()
+        minutes = table.duration.astype(np.int64)
+        if not self.span:
+            cells = self.cell_index(end // 3600)
+            self.counts += np.bincount(cells, minlength=7 * 24)
+            self.sums += np.bincount(cells, weights=minutes, minlength=7 * 24)
+            return self
+        start = end - minutes * 60
+        # 長さ 0 のログは終了時刻の時間帯に1回だけ数える
+        first = np.where(minutes > 0, start // 3600, end // 3600)
+        last = np.where(minutes > 0, (end - 1) // 3600, end // 3600)
+        n_hours = last - first + 1
+        rows = np.repeat(np.arange(len(end)), n_hours)
+        hours = first[rows] + np.arange(len(rows)) - np.repeat(np.cumsum(n_hours) - n_hours, n_hours)
+        overlap = np.minimum(end[rows], (hours + 1) * 3600) - np.maximum(start[rows], hours * 3600)
+        cells = self.cell_index(hours)
+        self.counts += np.bincount(cells, minlength=7 * 24)
+        self.sums += np.bincount(cells, weights=np.maximum(overlap, 0) / 60, minlength=7 * 24)
+        return self
+
+    def label(self):
+        """集計した値の名前 (グラフの見出し・目盛り用)"""
+        if self.mode == 'count':
+            # span=True では1件が何時間にもわたると、かかった時間帯ごとに1回ずつ数える
+            return "延べ時間数" if self.span else "回数"
+        return "合計時間 (分)" if self.mode == 'sum' else "平均時間 (分)"
+
+    def result(self):
+        if not self.seen: return None
+        if self.mode == 'count': grid = self.counts
+        elif self.mode == 'sum': grid = self.sums
+        else: grid = np.divide(self.sums, self.counts, out=np.zeros_like(self.sums), where=self.counts > 0)
+        return grid.reshape(7, 24)
+
+# ---------------------------------------------------------
+# 7. グラフ & 進捗計算クラス
+# ---------------------------------------------------------
+class FigureTemplate:
+    """軸・目盛り・格子などの静的な部分を作り終えた図。データの部分だけを差し替えて何度も描く"""
+    def __init__(self, figsize, dpi=None):
+        self.fig = mfigure.Figure(figsize=figsize, dpi=dpi)
+        self.canvas = backend_agg.FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.background = None
+
+    def save_background(self):
+        """今の見た目を背景として保存する (以後は restore_region で貼り戻してから上に描く)"""
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def to_png(self, full=False):
+        """full=True なら図全体を描き直す。False ならキャンバスに描いてある画素をそのまま PNG にする"""
+        buf = io.BytesIO()
+        if full:
+            self.fig.savefig(buf, format='png')
+        else:
+            mimage.imsave(buf, np.asarray(self.canvas.buffer_rgba()), format='png', dpi=self.fig.dpi)
+        buf.seek(0)
+        return buf
+
+# 図のひな形 (スレッドごと)
+chart_templates = threading.local()
+
+class GraphGenerator:
+    @staticmethod
+    def _select(logs, start_date=None, end_date=None, tasks_filter=None):
+        """ログ (LogTable または辞書のリスト) を期間・タスクで絞った LogTable にする (空なら None)"""
+        if logs is None: return None
+        table = logs if isinstance(logs, LogTable) else LogTable.from_logs(logs)
+        table = table.select(start_date, end_date, tasks_filter)
+        if not len(table): return None
+        return table
+
+    @staticmethod
+    def _prepare_df(logs, start_date=None, end_date=None, tasks_filter=None):
+        table = GraphGenerator._select(logs, start_date, end_date, tasks_filter)
+        if table is None: return None
+        return table.to_frame()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
     def get_font_prop(size=14, weight='normal'):
+        """(size, weight) ごとに1度だけ作る (FontProperties は Text に渡すときに複製されるので共有してよい)"""
         if os.path.exists(FONT_PATH):
             return fm.FontProperties(fname=FONT_PATH, size=size, weight=weight)
         return None
 
+    # pyplot のグローバル状態は使わず、図ごとに Figure と Agg キャンバスを持つ (スレッドから同時に描画できる)
     @staticmethod
-    def combine_images(image_buffers):
-        if not image_buffers: return None
-        images = [plt.imread(buf) for buf in image_buffers]
-        n = len(images)
-        if n == 1: return image_buffers[0]
-        
-        cols = 2 if n > 1 else 1
-        rows = (n + 1) // 2
-        fig = plt.figure(figsize=(10 * cols, 8 * rows))
-        
-        for i, img in enumerate(images):
-            ax = fig.add_subplot(rows, cols, i+1)
-            ax.imshow(img)
-            ax.axis('off')
-            
-        plt.tight_layout()
+    @contextlib.contextmanager
+    def figure(figsize, dpi=None, layout=None):
+        """描画用の Figure を作り、途中で例外が出ても必ず片付ける"""
+        fig = mfigure.Figure(figsize=figsize, dpi=dpi, layout=layout)
+        backend_agg.FigureCanvasAgg(fig)
+        try:
+            yield fig
+        finally:
+            fig.clear()
+
+    @staticmethod
+    def to_png(fig, **kwargs):
+        fig.tight_layout()
         buf = io.BytesIO()
-        plt.savefig(buf, format='png')
+        fig.savefig(buf, format='png', **kwargs)
         buf.seek(0)
-        plt.close()
         return buf
 
+    @staticmethod
+    def template(name, build):
+        """図のひな形をスレッド (ワーカー) ごとに1度だけ作って使い回す"""
+        templates = getattr(chart_templates, "items", None)
+        if templates is None:
+            templates = chart_templates.items = {}
+        if name not in templates:
+            templates[name] = build()
+        return templates[name]
+
+    @staticmethod
+    def warm_templates():
+        GraphGenerator.template("daily", GraphGenerator._build_daily_template)
+        GraphGenerator._heatmap_template(REPORT_AGGREGATORS['heatmap']().label())
+        GraphGenerator.template("punch", GraphGenerator._build_punch_card_template)
+
+    @staticmethod
+    def task_colors(tasks):
+        """タスク名 -> 色 (Pastel1 をタスク数で分割)"""
+        cmap = matplotlib.colormaps['Pastel1'].resampled(max(len(tasks), 1))
+        return {task: cmap(i) for i, task in enumerate(tasks)}
+
+    @staticmethod
+    def chart_parts(c_type, logs, start_date, end_date, tasks_filter):
+        """グラフ1枚分の (図のサイズ, 描画関数, 描画関数に渡すデータ)。データが無ければ None"""
+        if c_type == "timeline":
+            frame = GraphGenerator._timeline_frame(logs, start_date, end_date, tasks_filter)
+            if frame is None: return None
+            table, segments, days = frame
+            return (len(days) * 1.5 + 2, 10), GraphGenerator._draw_timeline_vertical, (table, segments, days)
+        if c_type not in REPORT_AGGREGATORS: return None
+        table = GraphGenerator._select(logs, start_date, end_date, tasks_filter)
+        if table is None: return None
+        return GraphGenerator.aggregate_parts(c_type, GraphGenerator.new_aggregator(c_type).add_table(table))
+
+    @staticmethod
+    def new_aggregator(c_type):
+        """グラフの種類ごとの集計 (add_table で少しずつ足していける)"""
+        return REPORT_AGGREGATORS[c_type]()
+
+    @staticmethod
+    def aggregate_parts(c_type, agg):
+        """集計し終えた agg から、グラフ1枚分の (図のサイズ, 描画関数, 描画関数に渡すデータ) を作る"""
+        if c_type == "pie":
+            task_sum = agg.result()
+            if task_sum is None or task_sum.empty: return None
+            return (10, 6), GraphGenerator._draw_pie_chart, (task_sum,)
+        if c_type == "bar":
+            pivot_df = agg.result()
+            if pivot_df is None or pivot_df.empty: return None
+            return (12, 6), GraphGenerator._draw_bar_chart, (pivot_df,)
+        grid = agg.result()
+        if grid is None: return None
+        if c_type == "heatmap":
+            return (10, 5), GraphGenerator._draw_heatmap, (grid, agg.label())
+        return (12, 6), GraphGenerator._draw_punch_card, (grid,)
+
+    @staticmethod
+    def render_parts(parts):
+        figsize, draw, args = parts
+        # ヒートマップとパンチカードは作り置きのひな形にデータだけ差し替えて描く
+        if draw is GraphGenerator._draw_heatmap: return GraphGenerator._render_heatmap_template(*args)
+        if draw is GraphGenerator._draw_punch_card: return GraphGenerator._render_punch_card_template(*args)
+        with GraphGenerator.figure(figsize) as fig:
+            draw(fig, fig.add_subplot(), *args)
+            return GraphGenerator.to_png(fig)
+
+    @staticmethod
+    def render_combined(parts_list):
+        """複数のグラフを1枚の図のサブ図として直接描く (個別に PNG にしてから並べ直さない)
+        1段に2枚まで、横幅が COMBINED_MAX_WIDTH に収まるように段を分けて並べる"""
+        rows = []
+        for parts in parts_list:
+            width = min(parts[0][0], COMBINED_MAX_WIDTH)
+            row = rows[-1] if rows else None
+            if row is None or len(row) >= 2 or sum(w for w, _ in row) + width > COMBINED_MAX_WIDTH:
+                row = []
+                rows.append(row)
+            row.append((width, parts))
+        fig_width = max(sum(w for w, _ in row) for row in rows)
+        heights = [max(parts[0][1] for _, parts in row) for row in rows]
+        with GraphGenerator.figure((fig_width, sum(heights)), layout="constrained") as fig:
+            row_figs = fig.subfigures(len(rows), 1, height_ratios=heights, squeeze=False)[:, 0]
+            for row_fig, row in zip(row_figs, rows):
+                widths = [w for w, _ in row]
+                # 図の幅に満たない段は右を空けて、グラフが横に引き伸ばされないようにする
+                rest = fig_width - sum(widths)
+                if rest > 0: widths.append(rest)
+                subs = row_fig.subfigures(1, len(widths), width_ratios=widths, squeeze=False)[0]
+                for sub, (_, (_, draw, args)) in zip(subs, row):
+                    draw(sub, sub.add_subplot(), *args)
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png')
+            buf.seek(0)
+            return buf
+
     @staticmethod
     def create_pie_chart(logs, start_date, end_date, tasks_filter):
-        df = GraphGenerator._prepare_df(logs, start_date, end_date, tasks_filter)
-        if df is None: return None
-        
+        parts = GraphGenerator.chart_parts("pie", logs, start_date, end_date, tasks_filter)
+        return GraphGenerator.render_parts(parts) if parts else None
+
+    @staticmethod
+    def _draw_pie_chart(fig, ax, task_sum):
         fp = GraphGenerator.get_font_prop(size=14)
-        plt.figure(figsize=(10, 6))
-        task_sum = df.groupby('task')['duration_min'].sum()
-        colors = plt.cm.Pastel1.colors
-        wedges, texts, autotexts = plt.pie(
+        colors = matplotlib.colormaps['Pastel1'].colors
+        wedges, texts, autotexts = ax.pie(
             task_sum, labels=None, autopct='%1.1f%%', startangle=90, colors=colors, pctdistance=0.85
         )
-        centre_circle = plt.Circle((0,0),0.70,fc='white')
-        fig = plt.gcf()
-        fig.gca().add_artist(centre_circle)
-        plt.legend(wedges, task_sum.index, title="Tasks", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1), prop=fp)
-        plt.title("行動内訳", fontproperties=fp, fontsize=16)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
+        ax.add_artist(patches.Circle((0, 0), 0.70, fc='white'))
+        ax.legend(wedges, task_sum.index, title="Tasks", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1), prop=fp)
+        ax.set_title("行動内訳", fontproperties=fp, fontsize=16)
 
     @staticmethod
     def create_bar_chart(logs, start_date, end_date, tasks_filter):
-        df = GraphGenerator._prepare_df(logs, start_date, end_date, tasks_filter)
-        if df is None: return None
+        parts = GraphGenerator.chart_parts("bar", logs, start_date, end_date, tasks_filter)
+        return GraphGenerator.render_parts(parts) if parts else None
+
+    @staticmethod
+    def _draw_bar_chart(fig, ax, pivot_df):
         fp = GraphGenerator.get_font_prop(size=14)
-        plt.figure(figsize=(12, 6))
-        pivot_df = df.pivot_table(index='date', columns='task', values='duration_min', aggfunc='sum', fill_value=0)
-        if pivot_df.empty: return None
-        ax = pivot_df.plot(kind='bar', stacked=True, colormap='Pastel1', figsize=(12, 6))
-        plt.title("日別積み上げグラフ", fontproperties=fp, fontsize=16)
-        plt.xlabel("日付", fontproperties=fp)
-        plt.ylabel("時間 (分)", fontproperties=fp)
-        plt.legend(prop=fp, bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.xticks(rotation=45, fontproperties=fp)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
+        # 積み上げ棒はタスクごとに下端をずらして描く (色は pandas の colormap 指定と同じ割り当て)
+        x = np.arange(len(pivot_df.index))
+        bottom = np.zeros(len(x))
+        colors = matplotlib.colormaps['Pastel1'](np.linspace(0, 1, len(pivot_df.columns)))
+        for color, task in zip(colors, pivot_df.columns):
+            values = pivot_df[task].to_numpy()
+            ax.bar(x, values, 0.5, bottom=bottom, color=color, label=task)
+            bottom += values
+        ax.set_xticks(x)
+        ax.set_xticklabels([str(d) for d in pivot_df.index], rotation=45, fontproperties=fp)
+        ax.set_xlim(-0.5, len(x) - 0.5)
+        ax.set_title("日別積み上げグラフ", fontproperties=fp, fontsize=16)
+        ax.set_xlabel("日付", fontproperties=fp)
+        ax.set_ylabel("時間 (分)", fontproperties=fp)
+        ax.legend(prop=fp, bbox_to_anchor=(1.05, 1), loc='upper left')
 
     @staticmethod
     def create_heatmap(logs, start_date, end_date, tasks_filter):
-        df = GraphGenerator._prepare_df(logs, start_date, end_date, tasks_filter)
-        if df is None: return None
+        parts = GraphGenerator.chart_parts("heatmap", logs, start_date, end_date, tasks_filter)
+        return GraphGenerator.render_parts(parts) if parts else None
+
+    @staticmethod
+    def _draw_heatmap(fig, ax, grid, label):
         fp = GraphGenerator.get_font_prop(size=14)
-        plt.figure(figsize=(10, 5))
-        df['weekday'] = df['ts_obj'].dt.weekday
-        df['hour'] = df['ts_obj'].dt.hour
-        heatmap_data = df.pivot_table(index='weekday', columns='hour', values='duration_min', aggfunc='count', fill_value=0)
-        heatmap_data = heatmap_data.reindex(index=range(7), columns=range(24), fill_value=0)
-        plt.imshow(heatmap_data, cmap='Blues', aspect='auto')
+        im = ax.imshow(grid, cmap='Blues', aspect='auto')
         days_label = ['月', '火', '水', '木', '金', '土', '日']
-        plt.yticks(range(7), days_label, fontproperties=fp)
-        plt.xticks(range(24), [str(h) for h in range(24)], fontproperties=fp)
-        plt.xlabel("時間帯 (時)", fontproperties=fp)
-        plt.ylabel("曜日", fontproperties=fp)
-        plt.title("活動リズム ヒートマップ (濃度=回数)", fontproperties=fp, fontsize=16)
-        plt.colorbar(label="回数", pad=0.02)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
+        ax.set_yticks(range(7), days_label, fontproperties=fp)
+        ax.set_xticks(range(24), [str(h) for h in range(24)], fontproperties=fp)
+        ax.set_xlabel("時間帯 (時)", fontproperties=fp)
+        ax.set_ylabel("曜日", fontproperties=fp)
+        ax.set_title(f"活動リズム ヒートマップ (濃度={label})", fontproperties=fp, fontsize=16)
+        fig.colorbar(im, ax=ax, label=label, pad=0.02)
+
+    @staticmethod
+    def _heatmap_template(label):
+        # 見出しが違うとひな形も別になる
+        return GraphGenerator.template(f"heatmap:{label}", lambda: GraphGenerator._build_heatmap_template(label))
+
+    @staticmethod
+    def _render_heatmap_template(grid, label):
+        t = GraphGenerator._heatmap_template(label)
+        t.image.set_data(grid)
+        t.image.set_clim(grid.min(), grid.max())
+        return t.to_png(full=True)
+
+    @staticmethod
+    def _build_heatmap_template(label):
+        t = FigureTemplate((10, 5))
+        GraphGenerator._draw_heatmap(t.fig, t.ax, np.zeros((7, 24)), label)
+        t.image = t.ax.images[0]
+        t.fig.tight_layout()
+        return t
 
     @staticmethod
     def create_punch_card(logs, start_date, end_date, tasks_filter):
-        df = GraphGenerator._prepare_df(logs, start_date, end_date, tasks_filter)
-        if df is None: return None
+        parts = GraphGenerator.chart_parts("punch", logs, start_date, end_date, tasks_filter)
+        return GraphGenerator.render_parts(parts) if parts else None
+
+    @staticmethod
+    def _draw_punch_card(fig, ax, grid):
         fp = GraphGenerator.get_font_prop(size=14)
-        df['weekday'] = df['ts_obj'].dt.weekday
-        df['hour'] = df['ts_obj'].dt.hour
-        grouped = df.groupby(['weekday', 'hour'])['duration_min'].sum().reset_index()
-        plt.figure(figsize=(12, 6))
-        plt.scatter(grouped['hour'], 6 - grouped['weekday'], s=grouped['duration_min']*2, alpha=0.6, c=grouped['duration_min'], cmap='viridis')
+        weekdays, hours = np.nonzero(grid)
+        totals = grid[weekdays, hours]
+        ax.scatter(hours, 6 - weekdays, s=totals*2, alpha=0.6, c=totals, cmap='viridis')
         days_label = ['日', '土', '金', '木', '水', '火', '月']
-        plt.yticks(range(7), days_label, fontproperties=fp)
-        plt.xticks(range(24), [str(h) for h in range(24)], fontproperties=fp)
-        plt.xlabel("時間帯 (時)", fontproperties=fp)
-        plt.ylabel("曜日", fontproperties=fp)
-        plt.title("パンチカード (円の大きさ=活動時間)", fontproperties=fp, fontsize=16)
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
+        ax.set_yticks(range(7), days_label, fontproperties=fp)
+        ax.set_xticks(range(24), [str(h) for h in range(24)], fontproperties=fp)
+        ax.set_xlabel("時間帯 (時)", fontproperties=fp)
+        ax.set_ylabel("曜日", fontproperties=fp)
+        ax.set_title("パンチカード (円の大きさ=活動時間)", fontproperties=fp, fontsize=16)
+        ax.grid(True, linestyle='--', alpha=0.5)
+
+    @staticmethod
+    def _render_punch_card_template(grid):
+        t = GraphGenerator.template("punch", GraphGenerator._build_punch_card_template)
+        weekdays, hours = np.nonzero(grid)
+        totals = grid[weekdays, hours]
+        t.points.set_offsets(np.column_stack([hours, 6 - weekdays]))
+        t.points.set_sizes(totals * 2)
+        t.points.set_array(totals)
+        t.points.autoscale()
+        return t.to_png(full=True)
+
+    @staticmethod
+    def _build_punch_card_template():
+        t = FigureTemplate((12, 6))
+        GraphGenerator._draw_punch_card(t.fig, t.ax, np.zeros((7, 24)))
+        t.points = t.ax.collections[0]
+        # 自動で決まっていた表示範囲を固定する (全マスに点がある場合と同じ範囲)
+        t.ax.set_xlim(-1.15, 24.15)
+        t.ax.set_ylim(-0.3, 6.3)
+        t.fig.tight_layout()
+        return t
 
     @staticmethod
     def create_timeline_vertical(logs, start_date, end_date, tasks_filter):
-        df = GraphGenerator._prepare_df(logs, start_date, end_date, tasks_filter)
-        if df is None: return None
+        parts = GraphGenerator.chart_parts("timeline", logs, start_date, end_date, tasks_filter)
+        return GraphGenerator.render_parts(parts) if parts else None
+
+    @staticmethod
+    def _day_segments(table):
+        """ログを JST の日ごとの区間に分ける (日付をまたぐログは日ごとに分割する)
+        戻り値: (1970-01-01 からの日数, 開始時刻[時], 終了時刻[時], 元の行番号) の配列"""
+        end = table.local_ts()
+        start = end - table.duration.astype(np.int64) * 60
+        first_day = start // 86400
+        # ちょうど 0:00 に終わったログは前日の分だけ
+        n_days = np.maximum((end - 1) // 86400 - first_day + 1, 1)
+        rows = np.repeat(np.arange(len(end)), n_days)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+        day = first_day[rows] + offsets
+        day_start = day * 86400
+        seg_start = np.maximum(start[rows], day_start)
+        seg_end = np.minimum(end[rows], day_start + 86400)
+        keep = seg_end > seg_start
+        return day[keep], (seg_start - day_start)[keep] / 3600, (seg_end - day_start)[keep] / 3600, rows[keep]
+
+    @staticmethod
+    def _bar_verts(left, right, top, bottom):
+        """縦棒の四角形の頂点 (n, 4, 2) を配列演算で作る"""
+        left, right = np.broadcast_arrays(left, right, top)[:2]
+        return np.stack([
+            np.stack([left, top], axis=1), np.stack([right, top], axis=1),
+            np.stack([right, bottom], axis=1), np.stack([left, bottom], axis=1),
+        ], axis=1)
+
+    @staticmethod
+    def _segment_tasks(table, rows):
+        """区間に出てくるタスク名 (出てきた順) と、区間ごとのタスク名の配列"""
+        names = np.asarray(table.tasks, dtype=object)[table.task[rows]]
+        return list(pd.unique(names)), names
+
+    @staticmethod
+    def _timeline_frame(logs, start_date, end_date, tasks_filter):
+        """縦タイムライン用の (LogTable, 日ごとの区間, 表示する日のリスト[日数])"""
+        table = GraphGenerator._select(logs, start_date, end_date, tasks_filter)
+        if table is None: return None
+        segments = GraphGenerator._day_segments(table)
+        days = np.unique(segments[0])[-30:]
+        if not len(days): return None
+        keep = np.isin(segments[0], days)
+        return table, tuple(a[keep] for a in segments), days
+
+    @staticmethod
+    def _draw_timeline_vertical(fig, ax, table, segments, days):
         fp = GraphGenerator.get_font_prop(size=12)
-        
-        df['date_only'] = df['ts_obj'].dt.date
-        df['end_time'] = df['ts_obj']
-        df['start_time'] = df['end_time'] - pd.to_timedelta(df['duration_min'], unit='m')
-        
-        dates = sorted(df['date_only'].unique())
-        if len(dates) > 30:
-             dates = dates[-30:]
-             df = df[df['date_only'].isin(dates)]
-             
-        fig, ax = plt.subplots(figsize=(len(dates) * 1.5 + 2, 10))
-        ax.set_xlim(-0.5, len(dates) - 0.5)
+        ax.set_xlim(-0.5, len(days) - 0.5)
         ax.set_ylim(24, 0)
-        
-        unique_tasks = df['task'].unique()
-        cmap = plt.cm.get_cmap('Pastel1', len(unique_tasks))
-        task_colors = {task: cmap(i) for i, task in enumerate(unique_tasks)}
-        
+
+        day, start_h, end_h, rows = segments
+        x = np.searchsorted(days, day)
+        tasks, names = GraphGenerator._segment_tasks(table, rows)
+        task_colors = GraphGenerator.task_colors(tasks)
+
+        # タスクごとに1つの PolyCollection にまとめる
+        verts = GraphGenerator._bar_verts(x - 0.4, x + 0.4, start_h, end_h)
         legend_handles = []
-        for task, color in task_colors.items():
-            legend_handles.append(patches.Patch(color=color, label=task))
-
-        for i, target_date in enumerate(dates):
-            day_df = df[df['date_only'] == target_date]
-            for _, row in day_df.iterrows():
-                start_h = row['start_time'].hour + row['start_time'].minute / 60
-                end_h = row['end_time'].hour + row['end_time'].minute / 60
-                if start_h < 0: start_h = 0
-                if end_h > 24: end_h = 24
-                duration_h = end_h - start_h
-                if duration_h <= 0: continue
-                rect = patches.Rectangle((i - 0.4, start_h), 0.8, duration_h, facecolor=task_colors[row['task']], edgecolor='white')
-                ax.add_patch(rect)
-
-        ax.set_xticks(range(len(dates)))
-        ax.set_xticklabels([d.strftime('%m/%d') for d in dates], fontproperties=fp, rotation=45)
+        for task in tasks:
+            bars = mcollections.PolyCollection(verts[names == task], facecolors=task_colors[task], edgecolors='white', label=task)
+            ax.add_collection(bars)
+            legend_handles.append(bars)
+
+        epoch = datetime.date(1970, 1, 1)
+        ax.set_xticks(range(len(days)))
+        ax.set_xticklabels([(epoch + datetime.timedelta(days=int(d))).strftime('%m/%d') for d in days], fontproperties=fp, rotation=45)
         ax.set_ylabel("時刻", fontproperties=fp)
         ax.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.title(f"タイムライン ({len(dates)}日間)", fontproperties=fp, fontsize=16)
-        plt.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left', prop=fp)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
+        ax.set_title(f"タイムライン ({len(days)}日間)", fontproperties=fp, fontsize=16)
+        ax.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left', prop=fp)
 
     @staticmethod
     def create_daily_timeline(logs, target_date=None):
-        if not logs: return None
-        df = pd.DataFrame(logs)
-        if df.empty: return None
-        if 'timestamp' in df.columns:
-             df['end_time'] = pd.to_datetime(df['timestamp']).dt.tz_convert(JST).dt.tz_localize(None)
-        else:
-             df['end_time'] = pd.to_datetime(df['date'])
-        
+        """target_date の 0:00〜24:00 のタイムライン。前日から続くログは 0:00 からの分を描く"""
+        table = GraphGenerator._select(logs, None, None, None)
+        if table is None: return None
+
         if target_date is None:
             target_date = datetime.datetime.now(JST).date()
-        
-        df['date_only'] = df['end_time'].dt.date
-        df = df[df['date_only'] == target_date].copy()
-        if df.empty: return None
-        
-        df['start_time'] = df['end_time'] - pd.to_timedelta(df['duration_min'], unit='m')
-        
+
+        day, start_h, end_h, rows = GraphGenerator._day_segments(table)
+        keep = day == (target_date - datetime.date(1970, 1, 1)).days
+        if not keep.any(): return None
+
+        # 格子や目盛りを描いた背景を貼り戻し、バーとラベルだけを上に描く
+        t = GraphGenerator.template("daily", GraphGenerator._build_daily_template)
+        t.canvas.restore_region(t.background)
+        bars, labels = GraphGenerator._daily_artists(t.ax, table, (start_h[keep], end_h[keep], rows[keep]))
+        t.ax.title.set_text(f"DAILY TIMELINE (15min Grid) - {target_date.strftime('%Y/%m/%d')}")
+        try:
+            # 格子はバーの上に来るので描き直す
+            for artist in bars + [t.grid] + labels + [t.ax.title]:
+                t.ax.draw_artist(artist)
+            return t.to_png()
+        finally:
+            for artist in bars + labels:
+                artist.remove()
+
+    @staticmethod
+    def _build_daily_template():
         fp = GraphGenerator.get_font_prop(size=12)
         fp_bold = GraphGenerator.get_font_prop(size=14, weight='bold')
+        t = FigureTemplate((8, 12), dpi=100)
+        ax = t.ax
         
-        fig, ax = plt.subplots(figsize=(8, 12))
         ax.set_xlim(0, 100)
         ax.set_ylim(24, 0)
         ax.set_facecolor('#f8f9fa')
         
-        for h in range(25):
-            ax.axhline(y=h, color='#dee2e6', linewidth=1) 
-            if h < 24:
-                for m in [0.25, 0.5, 0.75]:
-                    ax.axhline(y=h+m, color='#e9ecef', linewidth=0.5, linestyle=':')
+        # 1時間ごとの実線と15分ごとの点線を1つの LineCollection で引く
+        ys = np.arange(0, 24.25, 0.25)
+        hourly = ys % 1 == 0
+        t.grid = mcollections.LineCollection(
+            [[(0, y), (1, y)] for y in ys],
+            colors=np.where(hourly, '#dee2e6', '#e9ecef'),
+            linewidths=np.where(hourly, 1, 0.5),
+            linestyles=['solid' if h else ':' for h in hourly],
+            transform=ax.get_yaxis_transform()
+        )
+        ax.add_collection(t.grid)
 
         ax.set_yticks(range(0, 25))
         ax.set_yticklabels([f"{h:02d}:00" for h in range(25)], fontsize=10, fontproperties=fp)
-        
-        unique_tasks = df['task'].unique()
-        cmap = plt.cm.get_cmap('Pastel1', len(unique_tasks))
-        task_colors = {task: cmap(i) for i, task in enumerate(unique_tasks)}
-        
-        for _, row in df.iterrows():
-            start_h = row['start_time'].hour + row['start_time'].minute / 60
-            end_h = row['end_time'].hour + row['end_time'].minute / 60
-            if start_h < 0: start_h = 0
-            if end_h > 24: end_h = 24
-            duration_h = end_h - start_h
-            if duration_h <= 0: continue
-            
-            rect = patches.Rectangle((15, start_h), 60, duration_h, linewidth=1, edgecolor='white', facecolor=task_colors[row['task']])
-            ax.add_patch(rect)
-            
-            time_str = f"{row['start_time'].strftime('%H:%M')} - {row['end_time'].strftime('%H:%M')}"
-            memo_str = f" ({row['memo']})" if row.get('memo') else ""
-            label_str = f"{time_str}\n{row['task']}{memo_str}"
-            ax.text(18, start_h + (duration_h/2), label_str, va='center', ha='left', fontsize=10, fontproperties=fp, color='#495057')
-
         ax.set_xticks([])
         ax.spines['top'].set_visible(False)
         ax.spines['right'].set_visible(False)
         ax.spines['bottom'].set_visible(False)
         ax.spines['left'].set_color('#ced4da')
         
-        title_date = target_date.strftime('%Y/%m/%d')
-        plt.title(f"DAILY TIMELINE (15min Grid) - {title_date}", fontproperties=fp_bold, pad=20)
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        return buf
+        # 余白はタイトルが入った状態で決め、背景はタイトル抜きで保存する
+        ax.set_title("DAILY TIMELINE (15min Grid) - 2000/01/01", fontproperties=fp_bold, pad=20)
+        t.fig.tight_layout()
+        ax.title.set_text("")
+        t.save_background()
+        return t
+
+    @staticmethod
+    def _daily_artists(ax, table, segments):
+        """タスクごとのバーと時刻・メモのラベルを ax に載せて (バー, ラベル) で返す"""
+        fp = GraphGenerator.get_font_prop(size=12)
+        start_h, end_h, rows = segments
+        tasks, names = GraphGenerator._segment_tasks(table, rows)
+        task_colors = GraphGenerator.task_colors(tasks)
+        verts = GraphGenerator._bar_verts(15, 75, start_h, end_h)
+        bars = []
+        for task in tasks:
+            bars.append(ax.add_collection(mcollections.PolyCollection(verts[names == task], facecolors=task_colors[task], edgecolors='white', linewidths=1)))
+
+        # 時刻の表示はログ全体の開始〜終了 (日付をまたいでいても分割前の時刻)
+        end = table.local_ts()[rows]
+        start = end - table.duration[rows].astype(np.int64) * 60
+        labels = []
+        for s, e, task, memo, top, bottom in zip(start, end, names, table.memo[rows], start_h, end_h):
+            time_str = f"{(s // 3600) % 24:02d}:{(s // 60) % 60:02d} - {(e // 3600) % 24:02d}:{(e // 60) % 60:02d}"
+            memo_str = f" ({memo})" if memo else ""
+            label_str = f"{time_str}\n{task}{memo_str}"
+            labels.append(ax.text(18, (top + bottom) / 2, label_str, va='center', ha='left', fontsize=10, fontproperties=fp, color='#495057'))
+        return bars, labels
 
     @staticmethod
     def calculate_progress(logs, goals):
-        if not logs or not goals: return []
-        df = pd.DataFrame(logs)
-        if df.empty: return []
-        if 'timestamp' in df.columns:
-            df['ts_obj'] = pd.to_datetime(df['timestamp']).dt.tz_convert(JST).dt.tz_localize(None)
-        else:
-            df['ts_obj'] = pd.to_datetime(df['date'])
+        """logs: LogRollups / LogTable / 辞書のリスト。進捗は JST の日単位の集計から求める"""
+        if logs is None or not goals: return []
+        if isinstance(logs, LogRollups): rollups = logs
+        elif isinstance(logs, LogTable): rollups = LogRollups.from_table(logs)
+        else: rollups = LogRollups.from_table(LogTable.from_logs(logs))
+        if not rollups: return []
         now = datetime.datetime.now(JST).replace(tzinfo=None)
         today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_week = today - pd.Timedelta(days=today.weekday())
+        start_of_week = today - datetime.timedelta(days=today.weekday())
         start_of_month = today.replace(day=1)
+
+        def total(task_name, start, end=today):
+            return rollups.total(task_name, LogRollups.day_of(start), LogRollups.day_of(end))
+
         progress_data = []
         for task_name, goal_list in goals.items():
             if isinstance(goal_list, dict): goal_list = [goal_list]
@@ -568,19 +2055,20 @@ class GraphGenerator:
                 current = 0
                 label_period = ""
                 if period == "daily":
-                    current = df[(df['task'] == task_name) & (df['ts_obj'] >= today)]['duration_min'].sum()
+                    current = total(task_name, today)
                     label_period = "今日"
                 elif period == "weekly":
-                    current = df[(df['task'] == task_name) & (df['ts_obj'] >= start_of_week)]['duration_min'].sum()
+                    current = total(task_name, start_of_week)
                     label_period = "今週"
                 elif period == "monthly":
-                    current = df[(df['task'] == task_name) & (df['ts_obj'] >= start_of_month)]['duration_min'].sum()
+                    current = total(task_name, start_of_month)
                     label_period = "今月"
                 elif period == "custom" and created_at_str:
-                    try: start_date = pd.to_datetime(created_at_str).tz_localize(None)
-                    except: start_date = today
-                    end_date = start_date + pd.Timedelta(days=custom_days)
-                    current = df[(df['task'] == task_name) & (df['ts_obj'] >= start_date) & (df['ts_obj'] <= end_date)]['duration_min'].sum()
+                    try: start_date = datetime.datetime.fromisoformat(created_at_str).replace(tzinfo=None)
+                    except (TypeError, ValueError): start_date = today
+                    end_date = start_date + datetime.timedelta(days=custom_days)
+                    # 日単位の集計なので、作成日から数えて custom_days 日分 (暦日) を対象にする
+                    current = total(task_name, start_date, start_date + datetime.timedelta(days=max(custom_days - 1, 0)))
                     days_left = (end_date - now).days
                     if days_left < 0: days_left = 0
                     label_period = f"{custom_days}日間 (残{days_left}日)"
@@ -593,8 +2081,142 @@ class GraphGenerator:
                 })
         return progress_data
 
+# --- 描画ワーカー ---
+# matplotlib の描画はイベントループを止めるので、事前に温めた別プロセスで行う
+REPORT_CHARTS = {
+    "pie": "円グラフ",
+    "bar": "棒グラフ",
+    "heatmap": "ヒートマップ",
+    "punch": "パンチカード",
+    "timeline": "タイムライン",
+}
+# ログを少しずつ足して集計できるグラフと、その集計 (タイムラインは個々のログを描くので表のまま渡す)
+REPORT_AGGREGATORS = {
+    "pie": TaskTotals,
+    "bar": DailyTotals,
+    "heatmap": lambda: WeekHourGrid('count', span=True),
+    "punch": lambda: WeekHourGrid('sum', span=True),
+}
+
+render_pool = None
+# プールごとの実行中の描画数と、作り直しで退役したプール (-> そのワーカー)。実行中の描画が無くなったら止める
+render_pool_jobs = Counter()
+retired_render_pools = {}
+# 同時に実行する描画の数 (制限時間は枠を取ってから数えるので、順番待ちの時間は含まない)
+render_slots = asyncio.Semaphore(RENDER_WORKERS or min(32, (os.cpu_count() or 1) + 4))
+
+def init_render_worker():
+    """ワーカー起動時に1度だけ小さな図を描いて、フォントや描画系の読み込みを済ませておく"""
+    with GraphGenerator.figure((1, 1)) as fig:
+        fig.text(0.5, 0.5, "あ", fontproperties=GraphGenerator.get_font_prop())
+        fig.savefig(io.BytesIO(), format="png")
+    pd.to_datetime(["2024-01-01"])
+    # よく使うグラフのひな形も作っておく
+    GraphGenerator.warm_templates()
+
+def render_report(aggregates, table, start_date, end_date, tasks_filter, chart_types, combine):
+    """(ワーカーで実行) 選ばれたグラフを描画し、[(タイトル, PNG)] と結合画像の PNG (不要なら None) を返す
+    aggregates は DataManager.aggregate_report の集計、table はタイムライン用の表 (期間・タスクで絞り済み)
+    結合するときは1枚の図に直接描くので、個別の PNG は作らず None になる"""
+    charts = []
+    for c_type in chart_types:
+        if c_type not in REPORT_CHARTS: continue
+        if c_type in aggregates:
+            parts = GraphGenerator.aggregate_parts(c_type, aggregates[c_type])
+        else:
+            parts = GraphGenerator.chart_parts(c_type, table, start_date, end_date, tasks_filter)
+        if parts: charts.append((REPORT_CHARTS[c_type], parts))
+    if combine and len(charts) > 1:
+        combined = GraphGenerator.render_combined([parts for _, parts in charts])
+        return [(title, None) for title, _ in charts], combined.getvalue()
+    return [(title, GraphGenerator.render_parts(parts).getvalue()) for title, parts in charts], None
+
+def render_daily_timeline(table, target_date):
+    """(ワーカーで実行) デイリータイムラインの PNG を返す (データが無ければ None)"""
+    buf = GraphGenerator.create_daily_timeline(table, target_date=target_date)
+    return buf.getvalue() if buf else None
+
+def get_render_pool():
+    global render_pool
+    if render_pool is None and RENDER_WORKERS > 0:
+        render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_worker
+        )
+    return render_pool
+
+def warm_render_pool():
+    """起動直後にワーカーを立ち上げておく (最初のレポートで起動待ちにならないように)"""
+    pool = get_render_pool()
+    if pool is None: return
+    for _ in range(RENDER_WORKERS):
+        pool.submit(int)
+
+def terminate_workers(processes):
+    # 描画が止まったワーカーは shutdown では終わらないので直接止める
+    for proc in processes:
+        proc.terminate()
+
+def retire_render_pool(pool):
+    """以降の描画は新しいプールで行い、このプールは実行中の描画が終わってから止める"""
+    global render_pool
+    if render_pool is pool: render_pool = None
+    if pool in retired_render_pools: return
+    # shutdown 後は _processes が消えるので、止めるワーカーを先に覚えておく
+    retired_render_pools[pool] = list((pool._processes or {}).values())
+    pool.shutdown(wait=False)
+
+def release_render_pool(pool):
+    render_pool_jobs[pool] -= 1
+    if render_pool_jobs[pool] > 0: return
+    del render_pool_jobs[pool]
+    processes = retired_render_pools.pop(pool, None)
+    if processes is not None: terminate_workers(processes)
+
+def shutdown_render_pool():
+    global render_pool
+    pool, render_pool = render_pool, None
+    for processes in retired_render_pools.values():
+        terminate_workers(processes)
+    retired_render_pools.clear()
+    if pool is None: return
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def run_render(func, *args):
+    """描画関数をワーカーで実行して結果を待つ。実行が RENDER_TIMEOUT を超えたら asyncio.TimeoutError"""
+    loop = asyncio.get_running_loop()
+    async with render_slots:
+        pool = get_render_pool()
+        started = time.perf_counter()
+        render_stats["in_flight"] += 1
+        if pool is not None: render_pool_jobs[pool] += 1
+        try:
+            result = await asyncio.wait_for(loop.run_in_executor(pool, func, *args), RENDER_TIMEOUT)
+        except (asyncio.TimeoutError, BrokenProcessPool):
+            render_stats["errors"] += 1
+            # 止まった・落ちたワーカーが枠を塞ぎ続けないよう、新しい描画は作り直したプールに回す
+            if pool is not None: retire_render_pool(pool)
+            raise
+        finally:
+            render_stats["in_flight"] -= 1
+            if pool is not None: release_render_pool(pool)
+            elapsed = time.perf_counter() - started
+            span = current_span.get()
+            if span is not None:
+                for s in span.chain():
+                    s.render_sec += elapsed
+    render_stats["count"] += 1
+    render_stats["total_sec"] += elapsed
+    render_stats["max_sec"] = max(render_stats["max_sec"], elapsed)
+    render_stats["last_sec"] = elapsed
+    if "first_chart_sec" not in startup_stats:
+        startup_stats["first_chart_sec"] = elapsed
+        print(f"最初のグラフ作成: {elapsed:.2f}秒")
+    return result
+
 # ---------------------------------------------------------
-# 6. UIコンポーネント
+# 8. UIコンポーネント
 # ---------------------------------------------------------
 class ReportConfigView(discord.ui.View):
     def __init__(self, bot, tasks):
@@ -627,6 +2249,7 @@ class ReportPeriodSelect(discord.ui.Select):
             discord.SelectOption(label="期間を指定 (日付入力)", value="custom"),
         ]
         super().__init__(placeholder="📅 期間 (デフォルト: 過去30日)", options=options, row=0)
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         self.view.period = self.values[0]
         if self.values[0] == "custom":
@@ -640,6 +2263,7 @@ class ReportCustomDateModal(discord.ui.Modal, title="期間指定"):
     def __init__(self, parent_view):
         super().__init__()
         self.parent_view = parent_view
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         self.parent_view.custom_start = self.start_date.value
         self.parent_view.custom_end = self.end_date.value
@@ -652,6 +2276,7 @@ class ReportTaskSelect(discord.ui.Select):
         for t in tasks[:25]:
             options.append(discord.SelectOption(label=t["name"]))
         super().__init__(placeholder="✅ タスク (未選択で全て)", options=options, min_values=0, max_values=len(options), row=1)
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         self.view.selected_tasks = self.values
         await interaction.response.defer()
@@ -666,6 +2291,7 @@ class ReportChartSelect(discord.ui.Select):
             discord.SelectOption(label="タイムライン (時系列・縦長)", value="timeline"),
         ]
         super().__init__(placeholder="📈 グラフ種類 (複数選択可)", options=options, min_values=1, max_values=5, row=2)
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         self.view.selected_charts = self.values
         await interaction.response.defer()
@@ -677,6 +2303,7 @@ class ReportLayoutSelect(discord.ui.Select):
             discord.SelectOption(label="個別に出力する", value="separate", description="グラフごとに別の画像として出力"),
         ]
         super().__init__(placeholder="🖼️ 出力形式", options=options, row=3)
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         self.view.layout = self.values[0]
         await interaction.response.defer()
@@ -684,68 +2311,67 @@ class ReportLayoutSelect(discord.ui.Select):
 class ReportGenerateButton(discord.ui.Button):
     def __init__(self):
         super().__init__(label="レポート生成", style=discord.ButtonStyle.primary, row=4)
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         view = self.view
         
-        now = datetime.datetime.now(JST).replace(tzinfo=None)
+        # 期間は分単位に丸めて、同じ分の中の同じレポートは画像キャッシュから返せるようにする
+        now = datetime.datetime.now(JST).replace(tzinfo=None, second=0, microsecond=0)
         today = now.replace(hour=0, minute=0, second=0, microsecond=0)
         start_date = None
         end_date = None
         
-        if view.period == "7days": start_date = now - pd.Timedelta(days=7)
-        elif view.period == "30days": start_date = now - pd.Timedelta(days=30)
-        elif view.period == "this_week": start_date = today - pd.Timedelta(days=today.weekday())
+        if view.period == "7days": start_date = now - datetime.timedelta(days=7)
+        elif view.period == "30days": start_date = now - datetime.timedelta(days=30)
+        elif view.period == "this_week": start_date = today - datetime.timedelta(days=today.weekday())
         elif view.period == "last_week":
-            start_of_this_week = today - pd.Timedelta(days=today.weekday())
-            start_date = start_of_this_week - pd.Timedelta(days=7)
-            end_date = start_of_this_week - pd.Timedelta(seconds=1)
+            start_of_this_week = today - datetime.timedelta(days=today.weekday())
+            start_date = start_of_this_week - datetime.timedelta(days=7)
+            end_date = start_of_this_week - datetime.timedelta(seconds=1)
         elif view.period == "this_month": start_date = today.replace(day=1)
         elif view.period == "last_month":
             start_of_this_month = today.replace(day=1)
-            end_date = start_of_this_month - pd.Timedelta(seconds=1)
+            end_date = start_of_this_month - datetime.timedelta(seconds=1)
             start_date = end_date.replace(day=1, hour=0, minute=0, second=0)
         elif view.period == "custom":
             try:
-                start_date = pd.to_datetime(view.custom_start)
-                end_date = pd.to_datetime(view.custom_end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+                start_date = parse_date_input(view.custom_start)
+                end_date = parse_date_input(view.custom_end) + datetime.timedelta(days=1) - datetime.timedelta(seconds=1)
             except:
                 await interaction.followup.send("日付エラー", ephemeral=True)
                 return
         
         dm = DataManager(view.bot)
-        logs = await dm.fetch_logs(interaction.guild, limit=2000)
-        
-        generated_buffers = []
-        titles = []
         
         chart_types = view.selected_charts
         if not chart_types: chart_types = ["pie"]
 
-        for c_type in chart_types:
-            buf = None
-            t_str = ""
-            if c_type == "pie":
-                buf = GraphGenerator.create_pie_chart(logs, start_date, end_date, view.selected_tasks)
-                t_str = "円グラフ"
-            elif c_type == "bar":
-                buf = GraphGenerator.create_bar_chart(logs, start_date, end_date, view.selected_tasks)
-                t_str = "棒グラフ"
-            elif c_type == "heatmap":
-                buf = GraphGenerator.create_heatmap(logs, start_date, end_date, view.selected_tasks)
-                t_str = "ヒートマップ"
-            elif c_type == "punch":
-                buf = GraphGenerator.create_punch_card(logs, start_date, end_date, view.selected_tasks)
-                t_str = "パンチカード"
-            elif c_type == "timeline":
-                buf = GraphGenerator.create_timeline_vertical(logs, start_date, end_date, view.selected_tasks)
-                t_str = "タイムライン"
-            
-            if buf:
-                generated_buffers.append(buf)
-                titles.append(t_str)
+        combine = view.layout == "combined"
+        guild_id = interaction.guild.id
+        cache_key = (
+            guild_id, "report", tuple(chart_types), combine, start_date, end_date,
+            tuple(sorted(view.selected_tasks)), log_versions[guild_id]
+        )
+        cached = render_cache.get(cache_key)
+        if cached is None:
+            # ログを読みながら集計を進め、ワーカーには集計結果 (とタイムライン用の表) だけを渡す
+            aggregates, table = await dm.aggregate_report(interaction.guild, chart_types, start_date, end_date, view.selected_tasks)
+            try:
+                cached = await run_render(render_report, aggregates, table, start_date, end_date, view.selected_tasks, chart_types, combine)
+            except asyncio.TimeoutError:
+                await interaction.followup.send("⌛ グラフの作成がタイムアウトしました。期間やグラフの数を減らしてお試しください。", ephemeral=True)
+                return
+            except (BrokenProcessPool, asyncio.CancelledError):
+                # ワーカーが落ちた・プールが止められた (この処理自体が取り消されたときはそのまま伝える)
+                if asyncio.current_task().cancelling(): raise
+                await interaction.followup.send("⚠️ グラフの作成に失敗しました。もう一度お試しください。", ephemeral=True)
+                return
+            render_cache.put(cache_key, cached, sum(len(png or b"") for _, png in cached[0]) + len(cached[1] or b""))
+        rendered, combined_png = cached
+        titles = [t_str for t_str, _ in rendered]
 
-        if not generated_buffers:
+        if not rendered:
             await interaction.followup.send("対象データがありません。", ephemeral=True)
             return
 
@@ -754,9 +2380,8 @@ class ReportGenerateButton(discord.ui.Button):
         if start_date: p_str = f"{start_date.strftime('%Y/%m/%d')} ~"
         if end_date: p_str += f" {end_date.strftime('%Y/%m/%d')}"
 
-        if view.layout == "combined" and len(generated_buffers) > 1:
-            combined_buf = GraphGenerator.combine_images(generated_buffers)
-            file = discord.File(combined_buf, filename="report_combined.png")
+        if combined_png:
+            file = discord.File(io.BytesIO(combined_png), filename="report_combined.png")
             embed = discord.Embed(title=f"📊 統合レポート ({', '.join(titles)})", color=discord.Color.purple())
             embed.set_footer(text=f"期間: {p_str}")
             embed.set_image(url="attachment://report_combined.png")
@@ -768,8 +2393,8 @@ class ReportGenerateButton(discord.ui.Button):
                 await interaction.followup.send(embed=embed, file=file)
         else:
             files = []
-            for i, buf in enumerate(generated_buffers):
-                files.append(discord.File(buf, filename=f"report_{i}.png"))
+            for i, (_, png) in enumerate(rendered):
+                files.append(discord.File(io.BytesIO(png), filename=f"report_{i}.png"))
             content = f"📊 **レポート出力** (期間: {p_str})"
             if report_ch:
                 await report_ch.send(content=content, files=files)
@@ -785,9 +2410,11 @@ class GoalManagePanel(discord.ui.View):
         self.bot = bot
         self.tasks = tasks
     @discord.ui.button(label="➕ 目標を追加", style=discord.ButtonStyle.success, custom_id="goal_panel_add", row=0)
+    @tracked
     async def add_goal(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("目標を追加するタスクを選択:", view=GoalAddSelectView(self.bot, self.tasks), ephemeral=True)
     @discord.ui.button(label="👀 目標リスト (編集・削除)", style=discord.ButtonStyle.primary, custom_id="goal_panel_list_edit", row=0)
+    @tracked
     async def list_edit_goal(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         dm = DataManager(self.bot)
@@ -815,11 +2442,13 @@ class GoalManagePanel(discord.ui.View):
         view = GoalListActionView(self.bot, select_options)
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
     @discord.ui.button(label="🔄 更新", style=discord.ButtonStyle.secondary, custom_id="goal_panel_refresh", row=0)
+    @tracked
     async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
         dm = DataManager(self.bot)
         await dm.refresh_goals_panel(interaction.guild)
     @discord.ui.button(label="👀 目標一覧", style=discord.ButtonStyle.secondary, custom_id="goal_panel_list", row=1)
+    @tracked
     async def list_goals(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         dm = DataManager(self.bot)
@@ -844,17 +2473,18 @@ class GoalManagePanel(discord.ui.View):
         await interaction.followup.send(embed=embed, ephemeral=True)
     # 進捗確認ボタンを目標管理パネルに追加
     @discord.ui.button(label="🔥 進捗確認", style=discord.ButtonStyle.primary, custom_id="goal_panel_progress", row=1)
+    @tracked
     async def progress_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
         dm = DataManager(self.bot)
-        logs = await dm.fetch_logs(interaction.guild, limit=1000)
+        rollups = (await dm.get_log_cache(interaction.guild, sync=False)).get_rollups()
         goals = await dm.load_goals(interaction.guild)
         
         if not goals:
             await interaction.followup.send("目標が設定されていません。", ephemeral=True)
             return
             
-        progress_data = GraphGenerator.calculate_progress(logs, goals)
+        progress_data = GraphGenerator.calculate_progress(rollups, goals)
         
         if not progress_data:
             await interaction.followup.send("進捗データがありません。", ephemeral=True)
@@ -889,6 +2519,7 @@ class GoalListSelect(discord.ui.Select):
     def __init__(self, bot, options):
         super().__init__(placeholder="編集・削除する目標を選択...", options=options)
         self.bot = bot
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         selected_val = self.values[0]
         try:
@@ -909,9 +2540,11 @@ class GoalActionView(discord.ui.View):
         self.task_name = task_name
         self.index = index
     @discord.ui.button(label="✏️ 編集", style=discord.ButtonStyle.primary)
+    @tracked
     async def edit(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(GoalInputModal(self.bot, self.task_name, self.index))
     @discord.ui.button(label="🗑️ 削除", style=discord.ButtonStyle.danger)
+    @tracked
     async def delete(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
         dm = DataManager(self.bot)
@@ -923,7 +2556,7 @@ class GoalActionView(discord.ui.View):
                 task_goals.pop(self.index)
                 goals[self.task_name] = task_goals
                 await dm.save_goals(interaction.guild, goals)
-                await dm.refresh_goals_panel(interaction.guild)
+                dm.schedule_goals_panel_refresh(interaction.guild)
                 await interaction.followup.send("🗑️ 目標を削除しました。")
                 await resend_dashboard(interaction, self.bot)
             else: await interaction.followup.send("エラー: 目標なし")
@@ -939,6 +2572,7 @@ class GoalAddSelect(discord.ui.Select):
     def __init__(self, bot, options):
         super().__init__(placeholder="タスクを選択...", options=options)
         self.bot = bot
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         selected_name = self.values[0]
         await interaction.response.send_modal(GoalInputModal(self.bot, selected_name))
@@ -952,6 +2586,7 @@ class GoalInputModal(discord.ui.Modal, title="目標設定"):
         self.bot = bot
         self.task_name = task_name
         self.edit_index = edit_index
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
         try:
@@ -988,7 +2623,7 @@ class GoalInputModal(discord.ui.Modal, title="目標設定"):
                 goals[self.task_name].append(goal_data)
                 msg = f"✅ **{self.task_name}** の目標を追加しました。"
             await dm.save_goals(interaction.guild, goals)
-            await dm.refresh_goals_panel(interaction.guild)
+            dm.schedule_goals_panel_refresh(interaction.guild)
             await interaction.followup.send(msg)
             await resend_dashboard(interaction, self.bot)
         except ValueError:
@@ -1026,33 +2661,55 @@ class DashboardView(discord.ui.View):
         btn.callback = callback_func
         return btn
 
+    @tracked
     async def free_input_btn(self, interaction: discord.Interaction):
         await interaction.response.send_modal(FreeTaskStartModal())
 
+    @tracked
     async def daily_today_btn(self, interaction: discord.Interaction):
         await self.generate_daily_timeline(interaction, target_date=datetime.datetime.now(JST).date())
 
+    @tracked
     async def daily_yesterday_btn(self, interaction: discord.Interaction):
         yesterday = datetime.datetime.now(JST).date() - datetime.timedelta(days=1)
         await self.generate_daily_timeline(interaction, target_date=yesterday)
 
+    @timed
     async def generate_daily_timeline(self, interaction, target_date):
         await interaction.response.defer()
         dm = DataManager(self.bot)
-        logs = await dm.fetch_logs(interaction.guild, limit=300)
-        image_buf = GraphGenerator.create_daily_timeline(logs, target_date=target_date)
+        guild_id = interaction.guild.id
+        cache_key = (guild_id, "daily", target_date, log_versions[guild_id])
+        png = render_cache.get(cache_key)
+        if png is None:
+            day_start = datetime.datetime.combine(target_date, datetime.time.min)
+            # 翌日 0:00 をまたいで終わったログも当日分を描くので、翌日に終わったログまで読む
+            table = await dm.fetch_table(interaction.guild, start=day_start, end=day_start + datetime.timedelta(days=2))
+            try:
+                png = await run_render(render_daily_timeline, table, target_date)
+            except asyncio.TimeoutError:
+                await interaction.followup.send("⌛ タイムラインの作成がタイムアウトしました。")
+                return
+            except (BrokenProcessPool, asyncio.CancelledError):
+                if asyncio.current_task().cancelling(): raise
+                await interaction.followup.send("⚠️ タイムラインの作成に失敗しました。もう一度お試しください。")
+                return
+            # データが無い日も b"" として覚えておく
+            png = png or b""
+            render_cache.put(cache_key, png, len(png))
         
-        if image_buf is None:
+        if not png:
             await interaction.followup.send(f"{target_date.strftime('%Y/%m/%d')} のデータはありません。")
             await resend_dashboard(interaction, self.bot)
             return
             
-        file = discord.File(image_buf, filename="daily.png")
+        file = discord.File(io.BytesIO(png), filename="daily.png")
         embed = discord.Embed(title=f"📅 デイリータイムライン ({target_date.strftime('%Y/%m/%d')})", color=discord.Color.blue())
         embed.set_image(url="attachment://daily.png")
         await interaction.followup.send(embed=embed, file=file)
         await resend_dashboard(interaction, self.bot)
 
+    @tracked
     async def report_btn(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         dm = DataManager(self.bot)
@@ -1060,6 +2717,7 @@ class DashboardView(discord.ui.View):
         view = ReportConfigView(self.bot, tasks)
         await interaction.followup.send("📊 **レポート設定**\n条件を選択して「レポート生成」を押してください。", view=view, ephemeral=True)
 
+    @tracked
     async def manage_btn(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         dm = DataManager(self.bot)
@@ -1067,9 +2725,10 @@ class DashboardView(discord.ui.View):
         view = TaskManageView(self.bot, interaction.guild, tasks)
         await interaction.followup.send("📝 **タスク管理**", view=view, ephemeral=True)
 
+    @tracked
     async def refresh_btn(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        await resend_dashboard(interaction, self.bot)
+        await resend_dashboard(interaction, self.bot, rebuild=True)
 
 # --- TaskManageView ---
 class TaskManageView(discord.ui.View):
@@ -1080,24 +2739,30 @@ class TaskManageView(discord.ui.View):
         self.tasks = tasks
         self.dm = DataManager(bot)
 
+    @timed
     async def refresh_panel_message(self, interaction):
         await self.dm.save_tasks(self.guild, self.tasks)
         await interaction.followup.send("✅ 保存しました。")
-        await resend_dashboard(interaction, self.bot)
+        await resend_dashboard(interaction, self.bot, rebuild=True)
 
     @discord.ui.button(label="➕ 追加", style=discord.ButtonStyle.primary, row=0)
+    @tracked
     async def add_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(AddTaskModal(self))
     @discord.ui.button(label="🗑️ 削除", style=discord.ButtonStyle.danger, row=0)
+    @tracked
     async def delete_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("削除:", view=DeleteSelectView(self), ephemeral=True)
     @discord.ui.button(label="✏️ リネーム", style=discord.ButtonStyle.secondary, row=0)
+    @tracked
     async def rename_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("リネーム:", view=RenameSelectView(self), ephemeral=True)
     @discord.ui.button(label="🎨 色変更", style=discord.ButtonStyle.secondary, row=0)
+    @tracked
     async def color_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("色変更:", view=ColorSelectTaskView(self), ephemeral=True)
     @discord.ui.button(label="📋 一括編集", style=discord.ButtonStyle.success, row=1)
+    @tracked
     async def edit_all_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         default_text = "\n".join([t["name"] for t in self.tasks])
         await interaction.response.send_modal(EditAllModal(self, default_text))
@@ -1109,6 +2774,7 @@ class AddTaskModal(discord.ui.Modal, title="タスクの追加"):
     def __init__(self, parent_view):
         super().__init__()
         self.parent_view = parent_view
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
         new_task_name = self.name.value
@@ -1129,6 +2795,7 @@ class DeleteSelect(discord.ui.Select):
     def __init__(self, options, parent_view):
         super().__init__(placeholder="削除選択...", options=options)
         self.parent_view = parent_view
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         selected_name = self.values[0]
@@ -1145,6 +2812,7 @@ class RenameSelect(discord.ui.Select):
     def __init__(self, options, parent_view):
         super().__init__(placeholder="変更選択...", options=options)
         self.parent_view = parent_view
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         selected_name = self.values[0]
         await interaction.response.send_modal(RenameModal(self.parent_view, selected_name))
@@ -1156,6 +2824,7 @@ class RenameModal(discord.ui.Modal, title="名前の変更"):
         self.parent_view = parent_view
         self.old_name = old_name
         self.new_name.default = old_name
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
         val = self.new_name.value
@@ -1175,6 +2844,7 @@ class ColorSelectTask(discord.ui.Select):
     def __init__(self, options, parent_view):
         super().__init__(placeholder="タスク選択...", options=options)
         self.parent_view = parent_view
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         selected_name = self.values[0]
         await interaction.response.send_message(
@@ -1189,17 +2859,22 @@ class ColorSelectStyleView(discord.ui.View):
         self.parent_view = parent_view
         self.target_task_name = target_task_name
     @discord.ui.button(label="Primary (青)", style=discord.ButtonStyle.primary)
+    @tracked
     async def primary(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.update_color(interaction, "primary")
     @discord.ui.button(label="Secondary (灰)", style=discord.ButtonStyle.secondary)
+    @tracked
     async def secondary(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.update_color(interaction, "secondary")
     @discord.ui.button(label="Success (緑)", style=discord.ButtonStyle.success)
+    @tracked
     async def success(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.update_color(interaction, "success")
     @discord.ui.button(label="Danger (赤)", style=discord.ButtonStyle.danger)
+    @tracked
     async def danger(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.update_color(interaction, "danger")
+    @timed
     async def update_color(self, interaction: discord.Interaction, style_name):
         await interaction.response.defer()
         for task in self.parent_view.tasks:
@@ -1214,6 +2889,7 @@ class EditAllModal(discord.ui.Modal, title="並び替え・一括編集"):
         super().__init__()
         self.parent_view = parent_view
         self.text.default = default_text
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
         new_names = [line.strip() for line in self.text.value.split('\n') if line.strip()]
@@ -1230,6 +2906,7 @@ class EditAllModal(discord.ui.Modal, title="並び替え・一括編集"):
 
 class FreeTaskStartModal(discord.ui.Modal, title="自由入力でスタート"):
     task_name = discord.ui.TextInput(label="今からやることは？", placeholder="例: 電球交換")
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         selected = self.task_name.value
         now = datetime.datetime.now(JST)
@@ -1244,6 +2921,7 @@ class TaskButton(discord.ui.Button):
         style = BUTTON_STYLES.get(style_name, discord.ButtonStyle.secondary)
         super().__init__(label=task_name[:80], style=style, row=row)
         self.task_name = task_name
+    @tracked
     async def callback(self, interaction: discord.Interaction):
         now = datetime.datetime.now(JST)
         start_str = now.strftime("%Y-%m-%d %H:%M:%S")
@@ -1261,6 +2939,7 @@ class MemoModal(discord.ui.Modal, title='完了メモ'):
         self.view_item = view_item
         self.original_message = original_message
         
+    @tracked
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
         end_time = datetime.datetime.now(JST)
@@ -1287,16 +2966,18 @@ class MemoModal(discord.ui.Modal, title='完了メモ'):
         embed.add_field(name="時間", value=log_data['duration_str'])
         if self.memo.value:
             embed.add_field(name="📝 メモ", value=self.memo.value, inline=False)
+        # 記録が確定したらすぐに返信し、ボタンの無効化とパネル再設置は待たない
+        await interaction.followup.send(embed=embed)
         for child in self.view_item.children:
             child.disabled = True
-        await self.original_message.edit(view=self.view_item)
-        await interaction.followup.send(embed=embed)
+        run_in_background(self.original_message.edit(view=self.view_item), "完了ボタン無効化")
         await resend_dashboard(interaction, client)
 
 class FinishTaskView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
     @discord.ui.button(label="完了 (Done)", style=discord.ButtonStyle.green, custom_id="finish_btn_v4")
+    @tracked
     async def finish(self, interaction: discord.Interaction, button: discord.ui.Button):
         embed = interaction.message.embeds[0]
         try:
@@ -1315,9 +2996,8 @@ class FinishTaskView(discord.ui.View):
                 await interaction.response.send_message("エラー: タスク情報を読み取れませんでした。", ephemeral=True)
 
 # ---------------------------------------------------------
-# 7. 起動 & コマンド定義
+# 9. 起動 & コマンド定義
 # ---------------------------------------------------------
-@client.event
 async def on_ready():
     print(f'ログイン成功: {client.user}')
     try:
@@ -1326,10 +3006,63 @@ async def on_ready():
     except Exception as e:
         print(f"コマンド同期エラー: {e}")
         
+    # オフライン中に増えたログをローカルストアへ取り込む
+    run_in_background(reconcile_log_store(), "起動時のログ同期")
+    if not snapshot_job.is_running():
+        snapshot_job.start()
+    warm_render_pool()
+
+    if "ready_sec" not in startup_stats:
+        startup_stats["ready_sec"] = time.perf_counter() - STARTED_AT
+        print(f"起動時間: 読み込み {startup_stats['import_sec']:.2f}秒 / 準備完了まで {startup_stats['ready_sec']:.2f}秒 ({STARTUP_MODE})")
+        if STARTUP_MODE == "preload" and RENDER_WORKERS == 0:
+            Thread(target=preload_chart_stack, daemon=True).start()
+
     client.add_view(FinishTaskView())
-    client.add_view(DashboardView(client, [{"name": "Loading...", "style": "secondary"}]))
+    # タスクボタンは custom_id を持たない (再起動をまたいで待ち受けられない) ので、固定の機能ボタンだけを登録する
+    client.add_view(DashboardView(client, []))
+
+async def on_guild_channel_pins_update(channel, last_pin):
+    # ピンが変わったら設定キャッシュを破棄する
+    if getattr(channel, "guild", None) and channel.name == CH_DATA:
+        config_caches.pop(channel.guild.id, None)
+
+async def on_raw_message_edit(payload):
+    # 設定メッセージが Bot 以外の経路で書き換えられたらキャッシュを破棄する
+    cache = config_caches.get(payload.guild_id)
+    if not cache: return
+    for prefix, msg_id in cache.message_ids.items():
+        if msg_id == payload.message_id and payload.data.get("content") != cache.raw.get(prefix):
+            config_caches.pop(payload.guild_id, None)
+            return
+
+@tasks.loop(seconds=LOG_SNAPSHOT_INTERVAL)
+async def snapshot_job():
+    # 定期的にログ全件のスナップショットを作り、再起動後の初回読み込みを軽くする
+    dm = DataManager(client)
+    for guild in client.guilds:
+        if not discord.utils.get(guild.text_channels, name=CH_DATA): continue
+        if not log_store.is_backfilled(guild.id): continue
+        try:
+            if await dm.snapshot_is_stale(guild):
+                upto, count = await dm.write_snapshot(guild)
+                print(f"スナップショット作成: {guild.name} ({count}件, ~{upto})")
+        except Exception as e:
+            print(f"スナップショット作成エラー ({guild.name}): {e}")
+
+async def reconcile_log_store():
+    dm = DataManager(client)
+    for guild in client.guilds:
+        data_ch = discord.utils.get(guild.text_channels, name=CH_DATA)
+        if not data_ch: continue
+        try:
+            count = await dm.sync_log_store(guild, data_ch)
+            print(f"ログ同期完了: {guild.name} (+{count}件)")
+        except Exception as e:
+            print(f"ログ同期エラー ({guild.name}): {e}")
 
-@client.tree.command(name="setup_server", description="【推奨】サーバーのチャンネル構成を自動セットアップします")
+@app_commands.command(name="setup_server", description="【推奨】サーバーのチャンネル構成を自動セットアップします")
+@tracked
 async def setup_server(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
@@ -1365,7 +3098,8 @@ async def setup_server(interaction: discord.Interaction):
         except Exception:
             pass
 
-        await dash_ch.send("行動宣言パネル", view=DashboardView(client, tasks))
+        panel_msg = await dash_ch.send("行動宣言パネル", view=DashboardView(client, tasks))
+        save_panel(guild.id, "dashboard", dash_ch.id, panel_msg.id)
         
         # 4. 目標パネル更新
         await dm.refresh_goals_panel(guild)
@@ -1377,15 +3111,114 @@ async def setup_server(interaction: discord.Interaction):
     except Exception as e:
         await interaction.followup.send(f"⚠️ **予期せぬエラーが発生しました**\nエラー詳細: {e}", ephemeral=True)
 
-@client.tree.command(name="setup", description="現在のチャンネルにパネルを設置します")
+@app_commands.command(name="setup", description="現在のチャンネルにパネルを設置します")
+@tracked
 async def setup(interaction: discord.Interaction):
     await interaction.response.defer()
     try:
         dm = DataManager(client)
         tasks = await dm.load_tasks(interaction.guild)
-        await interaction.followup.send("行動宣言パネル", view=DashboardView(client, tasks))
+        panel_msg = await interaction.followup.send("行動宣言パネル", view=DashboardView(client, tasks), wait=True)
+        save_panel(interaction.guild.id, "dashboard", interaction.channel.id, panel_msg.id)
     except Exception as e:
         await interaction.followup.send(f"エラーが発生しました: {e}")
 
-keep_alive()
-client.run(TOKEN)
+@app_commands.command(name="snapshot", description="ログのスナップショットを今すぐ作成し、全件読み直しと一致するか確認します")
+@app_commands.default_permissions(manage_guild=True)
+@tracked
+async def snapshot(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    try:
+        dm = DataManager(client)
+        upto, count = await dm.write_snapshot(interaction.guild)
+        matched, snap_count, tail_count, full_count = await dm.verify_snapshot(interaction.guild)
+        result = "✅ 一致しました" if matched else "⚠️ 一致しませんでした"
+        await interaction.followup.send(
+            f"📦 スナップショットを作成しました ({count}件)\n"
+            f"検証: {result} (スナップショット {snap_count}件 + 以降 {tail_count}件 / 全件 {full_count}件)",
+            ephemeral=True
+        )
+    except Exception as e:
+        await interaction.followup.send(f"エラーが発生しました: {e}", ephemeral=True)
+
+@app_commands.command(name="stats", description="Bot の内部統計 (画像キャッシュなど) を表示します")
+@app_commands.default_permissions(manage_guild=True)
+@tracked
+async def stats(interaction: discord.Interaction):
+    c = render_cache.stats()
+    total = c["hits"] + c["misses"]
+    hit_rate = f"{c['hits'] / total * 100:.1f}%" if total else "-"
+    timing = lambda key: f"{startup_stats[key]:.2f}秒" if key in startup_stats else "-"
+    last_block = block_stats["last"]
+    await interaction.response.send_message(
+        f"🖼️ **画像キャッシュ**\n"
+        f"ヒット {c['hits']} / ミス {c['misses']} (ヒット率 {hit_rate}) / 追い出し {c['evictions']}\n"
+        f"{c['entries']}件 {c['bytes'] / 1024 / 1024:.1f}MB / 上限 {c['max_bytes'] / 1024 / 1024:.0f}MB\n"
+        f"⏱️ **起動** ({STARTUP_MODE})\n"
+        f"読み込み {timing('import_sec')} / 準備完了 {timing('ready_sec')} / "
+        f"グラフ用ライブラリ {timing('chart_stack_sec')} / 最初のグラフ {timing('first_chart_sec')}\n"
+        f"🐢 **イベントループの停止** ({BLOCK_THRESHOLD}秒以上)\n"
+        f"{block_stats['count']}回" + (f" / 最後: {last_block['handler']} {last_block['blocked_ms']:.0f}ms" if last_block else ""),
+        ephemeral=True
+    )
+
+@app_commands.command(name="timings", description="ハンドラごとの処理時間 (p50/p95/p99) と Discord API の呼び出し回数を表示します")
+@app_commands.default_permissions(manage_guild=True)
+@tracked
+async def timings(interaction: discord.Interaction):
+    report = timing_report()
+    if not report:
+        await interaction.response.send_message("まだ計測結果がありません。", ephemeral=True)
+        return
+    lines = []
+    for name, t in list(report.items())[:15]:
+        rest = " ".join(f"{k}:{v}" for k, v in sorted(t["rest_calls"].items()))
+        lines.append(
+            f"{name} ×{t['calls']} (エラー {t['errors']})\n"
+            f"  {t['p50_ms']:.0f}/{t['p95_ms']:.0f}/{t['p99_ms']:.0f}ms 描画 {t['render_sec']:.1f}s "
+            f"送信 {t['bytes_up'] / 1024:.0f}KB {rest}"
+        )
+    text = "\n".join(lines)
+    if len(text) > 1900: text = text[:1900] + "\n…"
+    await interaction.response.send_message(f"⏱️ **処理時間** (p50/p95/p99, 合計時間の長い順)\n```\n{text}\n```", ephemeral=True)
+
+def create_client():
+    """Bot を作り、イベントとスラッシュコマンドを登録する"""
+    intents = discord.Intents.default()
+    intents.message_content = True
+    bot = commands.Bot(command_prefix='!', intents=intents)
+    instrument_http(bot.http)
+    for event in (on_ready, on_guild_channel_pins_update, on_raw_message_edit):
+        bot.event(event)
+    for command in (setup_server, setup, snapshot, stats, timings):
+        bot.tree.add_command(command)
+    return bot
+
+startup_stats["import_sec"] = time.perf_counter() - STARTED_AT
+if STARTUP_MODE == "eager" and RENDER_WORKERS == 0:
+    preload_chart_stack()
+
+async def run_bot():
+    """HTTP サーバーと Bot を同じイベントループで動かし、Bot が止まったら一緒に片付ける"""
+    global client, loop_watchdog
+    client = create_client()
+    discord.utils.setup_logging()
+    await start_http_server()
+    loop_watchdog = LoopWatchdog(BLOCK_THRESHOLD, BLOCK_LOG_PATH)
+    loop_watchdog.start()
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    try:
+        async with client:
+            await client.start(TOKEN)
+    finally:
+        lag_monitor.cancel()
+        loop_watchdog.stop()
+        log_store.commit()
+        await stop_http_server()
+        shutdown_render_pool()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        pass